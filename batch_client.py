@@ -0,0 +1,179 @@
+"""
+Groq Batch API client for calendar generation that isn't latency-critical.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+BATCH_FLUSH_INTERVAL_S = float(os.getenv("BATCH_FLUSH_INTERVAL_S", "5"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "5000"))
+
+
+class BatchClient:
+    """
+    Submits chat completion requests as a single Groq batch job.
+
+    Batch jobs are billed at a discount and draw on a separate rate-limit
+    pool, at the cost of latency (minutes to hours).
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        poll_interval: float = 5.0,
+        max_poll_interval: float = 300.0,
+        completion_window: str = "24h"
+    ):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.completion_window = completion_window
+
+    async def run(self, bodies: Dict[str, dict]) -> Dict[str, Optional[str]]:
+        """
+        Run chat completion request bodies as one batch and wait for it.
+
+        Args:
+            bodies: Request bodies keyed by custom_id
+
+        Returns:
+            Message content keyed by custom_id (None for failed requests)
+        """
+        if not bodies:
+            return {}
+
+        lines = [
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body})
+            for custom_id, body in bodies.items()
+        ]
+        input_file = await self.client.files.create(
+            file=("calendar_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        logger.info("Submitted Groq batch %s with %d requests", batch.id, len(bodies))
+
+        # Poll with exponential backoff
+        delay = self.poll_interval
+        while batch.status not in TERMINAL_STATUSES:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Groq batch {batch.id} finished with status '{batch.status}'")
+
+        output = await self.client.files.content(batch.output_file_id)
+        results: Dict[str, Optional[str]] = {custom_id: None for custom_id in bodies}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                continue
+            results[record["custom_id"]] = content.strip() if content else None
+
+        return results
+
+
+class BatchQueue:
+    """
+    Collects request bodies from concurrent callers into shared batch jobs.
+
+    A batch is submitted once max_size bodies are waiting or flush_interval
+    seconds after the first one arrived, whichever comes first, so several
+    calendars generated at the same time share one job. The queue belongs
+    to the event loop it is first used on. The collector task stops once no
+    more requests are waiting and calls `on_idle`; the next submit starts
+    a new one.
+    """
+
+    def __init__(
+        self,
+        batch_client: BatchClient,
+        max_size: int = BATCH_MAX_SIZE,
+        flush_interval: float = BATCH_FLUSH_INTERVAL_S,
+        on_idle: Optional[Callable[[], None]] = None
+    ):
+        self.batch_client = batch_client
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.on_idle = on_idle
+        self._queue: "asyncio.Queue[Tuple[dict, asyncio.Future]]" = asyncio.Queue()
+        self._ids = itertools.count()
+        self._collector: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def submit(self, body: dict) -> Optional[str]:
+        """
+        Queue one chat completion request body and wait for its result.
+
+        Returns:
+            Message content (None if the request failed within the batch)
+
+        Raises:
+            Exception: If the whole batch job failed
+        """
+        if self._collector is None or self._collector.done():
+            self._collector = asyncio.create_task(self._collect())
+            if self.on_idle is not None:
+                self._collector.add_done_callback(lambda _: self.on_idle())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((body, future))
+        return await future
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._queue.empty():
+            pending = [self._queue.get_nowait()]
+            deadline = loop.time() + self.flush_interval
+            while len(pending) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Flush in the background so the next batch starts collecting now
+            task = asyncio.create_task(self._flush(pending))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, pending: List[Tuple[dict, asyncio.Future]]) -> None:
+        bodies = {}
+        futures = {}
+        for body, future in pending:
+            custom_id = f"q{next(self._ids)}"
+            bodies[custom_id] = body
+            futures[custom_id] = future
+
+        try:
+            results = await self.batch_client.run(bodies)
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for custom_id, future in futures.items():
+            if not future.done():
+                future.set_result(results.get(custom_id))
@@ -1,157 +1,166 @@
 """
 Main orchestrator for generating content calendars.
 """
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional, Set, Tuple
+import asyncio
+import logging
+import os
 import random
+from openai import AsyncOpenAI
+from pydantic import BaseModel
 from models import (
     CalendarRequest, CalendarResponse, ContentCalendar,
-    CompanyInfo, Persona, Post, ContentType
+    CompanyInfo, Persona, Post, PostJob, ReplyJob, Keyword
 )
 from content_generator import ContentGenerator
 from scheduler import Scheduler
 from validator import QualityValidator
 
+logger = logging.getLogger(__name__)
+
 
 class CalendarGenerator:
     """Main class that orchestrates calendar generation."""
     
-    def __init__(self):
-        self.content_generator = ContentGenerator()
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        batch_size: int = 4,
+        client: Optional[AsyncOpenAI] = None
+    ):
+        self.content_generator = ContentGenerator(client=client)
         self.validator = QualityValidator()
+        self.max_concurrency = max_concurrency  # Max in-flight Groq requests
+        self.batch_size = batch_size  # Max posts generated per Groq request
+        # Default for the batch argument below; interactive deployments leave it off
+        self.batch_mode = os.getenv("GROQ_BATCH_MODE", "0") == "1"
+    
+    def generate_calendar(
+        self,
+        request: CalendarRequest,
+        seed: Optional[int] = None,
+        batch: Optional[bool] = None
+    ) -> CalendarResponse:
+        """Synchronous wrapper around agenerate_calendar."""
+        return asyncio.run(self.agenerate_calendar(request, seed=seed, batch=batch))
     
-    def generate_calendar(self, request: CalendarRequest) -> CalendarResponse:
+    async def agenerate_calendar(
+        self,
+        request: CalendarRequest,
+        seed: Optional[int] = None,
+        batch: Optional[bool] = None
+    ) -> CalendarResponse:
         """
         Generate a complete content calendar.
         
+        Post and reply generation calls are independent of each other, so
+        they are dispatched concurrently (bounded by max_concurrency).
+        
         Args:
             request: CalendarRequest with all inputs
+            seed: Optional seed for all random choices (slots, assignments,
+                keywords and replies)
+            batch: Use the Groq Batch API (cheaper, but can take hours);
+                defaults to GROQ_BATCH_MODE
             
         Returns:
             CalendarResponse with calendar and quality metrics
         """
-        # Determine week start
-        if request.week_start:
-            week_start = request.week_start
-        else:
-            # Start from next Monday
-            today = datetime.now()
-            days_until_monday = (7 - today.weekday()) % 7
-            if days_until_monday == 0:
-                days_until_monday = 7
-            week_start = (today + timedelta(days=days_until_monday)).replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
+        if batch is None:
+            batch = self.batch_mode
+        
+        week_start = self._week_start(request)
         
         # Initialize scheduler
+        rng = random.Random(seed)
         scheduler = Scheduler(
             posts_per_week=request.posts_per_week,
             subreddits=request.subreddits,
-            personas=request.personas
+            personas=request.personas,
+            rng=rng
         )
         
-        # Step 1: Assign subreddits and personas to posts
-        subreddit_assignments = scheduler.assign_subreddits(request.posts_per_week)
-        persona_usernames = scheduler.assign_personas(request.posts_per_week)  # Returns usernames
-        
-        # Step 2: Generate post content
-        posts_data = []
-        existing_posts = []
-        
-        for i in range(request.posts_per_week):
-            # Select keywords (use 1-3 keywords per post)
-            num_keywords = random.randint(1, 3)
-            selected_keywords = random.sample(request.keywords, min(num_keywords, len(request.keywords)))
-            keyword_ids = [kw.keyword_id for kw in selected_keywords]
-            keyword_texts = [kw.keyword for kw in selected_keywords]
-            query = ", ".join(keyword_texts)  # Combine keywords for context
-            
-            # Get persona object
-            persona = next(p for p in request.personas if p.username == persona_usernames[i])
-            
-            # Generate post
-            try:
-                post_content = self.content_generator.generate_post(
-                    company=request.company_info,
-                    persona=persona,
-                    subreddit=subreddit_assignments[i],
-                    query=query,
-                    keywords=keyword_texts if keyword_texts else None,
-                    existing_posts=existing_posts
-                )
-            except Exception as e:
-                # Groq failed - return error with helpful message
-                error_msg = str(e)
-                raise Exception(
-                    f"Failed to generate post {i+1}/{request.posts_per_week} for {persona.name} in r/{subreddit_assignments[i]}. "
-                    f"Groq API error: {error_msg}. "
-                    f"Please check your GROQ_API_KEY in .env file and verify it's valid at https://console.groq.com/"
-                )
+        bounded = self._bounded()
+        
+        # Steps 1-2a: Assign subreddits and personas, and plan each post
+        post_jobs = self._plan_posts(request, scheduler, rng)
+        used_samples: Set[int] = set()  # Structural cache samples already in this calendar
+        
+        # Step 2b: Generate post content, either as one Batch API job or
+        # concurrently with several posts of the same persona per request
+        if batch:
+            post_contents = await self.content_generator.agenerate_posts_offline(
+                request.company_info, post_jobs, used_samples
+            )
+        else:
+            batches = self._batch_jobs(post_jobs)
+            batch_contents = await asyncio.gather(*[
+                bounded(self._generate_post_batch(request, indices, post_jobs, used_samples))
+                for indices in batches
+            ], return_exceptions=True)
             
-            posts_data.append({
-                "title": post_content["title"],
-                "content": post_content["content"],
-                "persona": persona.name,
-                "username": persona.username,
-                "subreddit": subreddit_assignments[i],
-                "query": query,
-                "keyword_ids": keyword_ids
-            })
+            # Let every batch finish before surfacing a failure, so no
+            # request is left running in the background
+            for contents in batch_contents:
+                if isinstance(contents, Exception):
+                    raise contents
             
-            # Create temporary post for overlap checking
-            temp_post = Post(
-                id=f"temp_{i}",
-                date=datetime.now(),
-                persona=persona.name,
-                username=persona.username,
-                subreddit=subreddit_assignments[i],
-                title=post_content["title"],
-                content=post_content["content"],
-                content_type=ContentType.POST,
-                keyword_ids=keyword_ids
-            )
-            existing_posts.append(temp_post)
+            post_contents = [None] * len(post_jobs)
+            for indices, contents in zip(batches, batch_contents):
+                for i, post_content in zip(indices, contents):
+                    post_contents[i] = post_content
+        
+        posts_data = [
+            self._post_data(post_content, job)
+            for post_content, job in zip(post_contents, post_jobs)
+        ]
         
         # Step 3: Schedule posts
         posts = scheduler.distribute_posts(week_start, posts_data)
         
-        # Step 4: Generate replies
-        reply_data = {}
+        # Step 4: Generate replies (second wave, once parent posts exist)
+        posts_by_thread: Dict[str, List[Post]] = defaultdict(list)
+        for post in posts:
+            posts_by_thread[post.thread_id].append(post)
+        
+        other_personas = self._other_personas(request.personas)
+        
+        reply_plan = []
         for post in posts:
             # Decide if this post should get a reply (70% chance)
-            if random.random() < 0.7:
+            if rng.random() < 0.7:
                 # Select a different persona for reply
-                reply_persona = random.choice([
-                    p for p in request.personas if p.username != post.username
-                ])
+                reply_persona = rng.choice(other_personas[post.username])
                 
                 # Get thread posts for context
-                thread_posts = [p for p in posts if p.thread_id == post.thread_id]
+                thread_posts = posts_by_thread[post.thread_id]
                 
-                # Generate reply
-                try:
-                    reply_content = self.content_generator.generate_reply(
-                        company=request.company_info,
-                        persona=reply_persona,
-                        parent_post=post,
-                        thread_posts=thread_posts,
-                        subreddit=post.subreddit
-                    )
-                    
-                    # Only add reply if Groq successfully generated it (not None)
-                    if reply_content:
-                        reply_data[post.id] = {
-                            "content": reply_content,
-                            "persona": reply_persona.name,
-                            "username": reply_persona.username
-                        }
-                    else:
-                        # Groq failed but we continue without this reply
-                        print(f"⚠️  Skipping reply for post {post.id} - Groq returned None")
-                except Exception as e:
-                    # Groq failed for reply - log but continue (replies are optional)
-                    print(f"⚠️  Failed to generate reply for post {post.id}: {e}")
-                    # Continue without this reply
+                reply_plan.append(ReplyJob(
+                    persona=reply_persona,
+                    parent_post=post,
+                    thread_posts=thread_posts
+                ))
+        
+        if batch:
+            reply_contents = await self.content_generator.agenerate_replies_offline(
+                request.company_info, reply_plan, max_concurrency=self.max_concurrency
+            )
+        else:
+            reply_contents = await self.content_generator.agenerate_replies(
+                request.company_info, reply_plan, max_concurrency=self.max_concurrency
+            )
+        
+        reply_data = {}
+        for reply_content, job in zip(reply_contents, reply_plan):
+            # Only add reply if Groq successfully generated it (not None)
+            if reply_content:
+                reply_data[job.parent_post.id] = {
+                    "content": reply_content,
+                    "persona": job.persona.name,
+                    "username": job.persona.username
+                }
         
         # Step 5: Schedule replies
         replies = scheduler.schedule_replies(posts, reply_data)
@@ -168,20 +177,288 @@ class CalendarGenerator:
             warnings=warnings
         )
     
-    def generate_next_week(self, request: CalendarRequest, current_week_start: datetime) -> CalendarResponse:
+    async def astream_calendar(
+        self,
+        request: CalendarRequest,
+        seed: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, BaseModel]]:
+        """
+        Generate a content calendar, yielding entries as soon as they exist.
+        
+        Post slots are planned before any content is generated, so each post
+        is yielded as soon as its Groq request finishes and its reply starts
+        generating right away. Replies are yielded once all posts are in,
+        since reply IDs and timing are scheduled across the whole week.
+        Always uses live Groq calls, not the Batch API.
+        
+        Args:
+            request: CalendarRequest with all inputs
+            seed: Optional seed for all random choices (slots, assignments,
+                keywords and replies)
+            
+        Yields:
+            ("entry", CalendarEntry) per post and reply, then
+            ("done", CalendarResponse) with the full calendar and quality metrics
+        """
+        week_start = self._week_start(request)
+        rng = random.Random(seed)
+        scheduler = Scheduler(
+            posts_per_week=request.posts_per_week,
+            subreddits=request.subreddits,
+            personas=request.personas,
+            rng=rng
+        )
+        bounded = self._bounded()
+        
+        post_jobs = self._plan_posts(request, scheduler, rng)
+        post_times = scheduler.plan_slots(week_start, len(post_jobs))
+        post_jobs = post_jobs[:len(post_times)]
+        used_samples: Set[int] = set()  # Structural cache samples already in this calendar
+        
+        # Decide replies up front so the plan doesn't depend on completion order
+        other_personas = self._other_personas(request.personas)
+        reply_personas: List[Optional[Persona]] = []
+        for job in post_jobs:
+            reply_persona = None
+            if rng.random() < 0.7:
+                reply_persona = rng.choice(other_personas[job.persona.username])
+            reply_personas.append(reply_persona)
+        
+        async def generate_batch(indices: List[int]):
+            return indices, await bounded(self._generate_post_batch(request, indices, post_jobs, used_samples))
+        
+        batch_tasks = [asyncio.create_task(generate_batch(indices)) for indices in self._batch_jobs(post_jobs)]
+        reply_tasks: Dict[int, asyncio.Task] = {}
+        posts: List[Optional[Post]] = [None] * len(post_jobs)
+        try:
+            for next_batch in asyncio.as_completed(batch_tasks):
+                indices, contents = await next_batch
+                for i, post_content in zip(indices, contents):
+                    post = scheduler.make_post(i, post_times[i], self._post_data(post_content, post_jobs[i]))
+                    posts[i] = post
+                    if reply_personas[i]:
+                        reply_tasks[i] = asyncio.create_task(bounded(self.content_generator.agenerate_reply(
+                            company=request.company_info,
+                            persona=reply_personas[i],
+                            parent_post=post,
+                            thread_posts=[post],
+                            subreddit=post.subreddit
+                        )))
+                    yield "entry", scheduler.make_entry(post)
+            
+            reply_contents = await asyncio.gather(*reply_tasks.values(), return_exceptions=True)
+        finally:
+            # Stop outstanding Groq calls if a batch failed or the client went away
+            for task in [*batch_tasks, *reply_tasks.values()]:
+                task.cancel()
+        
+        reply_data = {}
+        for i, reply_content in zip(reply_tasks, reply_contents):
+            if isinstance(reply_content, Exception):
+                # Groq failed for reply - log but continue (replies are optional)
+                logger.warning("Failed to generate reply for post %s: %s", posts[i].id, reply_content)
+            elif reply_content:
+                reply_data[posts[i].id] = {
+                    "content": reply_content,
+                    "persona": reply_personas[i].name,
+                    "username": reply_personas[i].username
+                }
+        
+        replies = scheduler.schedule_replies(posts, reply_data)
+        for reply in replies:
+            yield "entry", scheduler.make_entry(reply)
+        
+        calendar = scheduler.create_calendar(week_start, posts, replies)
+        quality_score, warnings = self.validator.validate(calendar)
+        yield "done", CalendarResponse(
+            calendar=calendar,
+            quality_score=quality_score,
+            warnings=warnings
+        )
+    
+    @staticmethod
+    def _week_start(request: CalendarRequest) -> datetime:
+        """Return the requested week start, or next Monday at midnight."""
+        if request.week_start:
+            return request.week_start
+        
+        # Start from next Monday
+        today = datetime.now()
+        days_until_monday = (7 - today.weekday()) % 7
+        if days_until_monday == 0:
+            days_until_monday = 7
+        return (today + timedelta(days=days_until_monday)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+    
+    def _bounded(self) -> Callable[[Awaitable], Awaitable]:
+        """Return a wrapper that bounds the number of concurrent Groq requests."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+        
+        return bounded
+    
+    def _plan_posts(
+        self,
+        request: CalendarRequest,
+        scheduler: Scheduler,
+        rng: random.Random
+    ) -> List[PostJob]:
+        """Assign subreddits, personas and keywords to every post (no LLM calls)."""
+        subreddit_assignments = scheduler.assign_subreddits(request.posts_per_week)
+        personas = scheduler.assign_persona_objects(request.posts_per_week)
+        
+        # Keywords are partitioned up front so no post's prompt depends on
+        # another post's output
+        keyword_plan = self._plan_keywords(request.keywords, request.posts_per_week, rng)
+        queries = [", ".join(kw.keyword for kw in selected) for selected in keyword_plan]
+        
+        post_jobs = []
+        for i, selected_keywords in enumerate(keyword_plan):
+            post_jobs.append(PostJob(
+                persona=personas[i],
+                subreddit=subreddit_assignments[i],
+                query=queries[i],  # Combine keywords for context
+                keywords=[kw.keyword for kw in selected_keywords],
+                keyword_ids=[kw.keyword_id for kw in selected_keywords],
+                avoid_topics=queries[max(0, i - 3):i]  # Neighbouring planned topics
+            ))
+        return post_jobs
+    
+    @staticmethod
+    def _post_data(post_content: dict, job: PostJob) -> dict:
+        """Combine generated post content with its plan, for the scheduler."""
+        return {
+            "title": post_content["title"],
+            "content": post_content["content"],
+            "persona": job.persona.name,
+            "username": job.persona.username,
+            "subreddit": job.subreddit,
+            "query": job.query,
+            "keyword_ids": job.keyword_ids
+        }
+    
+    @staticmethod
+    def _other_personas(personas: List[Persona]) -> Dict[str, List[Persona]]:
+        """Map each username to the personas that can reply to its posts."""
+        return {
+            persona.username: [p for p in personas if p.username != persona.username]
+            for persona in personas
+        }
+    
+    def _plan_keywords(
+        self,
+        keywords: List[Keyword],
+        num_posts: int,
+        rng: random.Random
+    ) -> List[List[Keyword]]:
+        """
+        Partition keywords across posts up front.
+        
+        Keywords are shuffled and handed out round-robin (1-3 per post), so
+        consecutive posts cover different keywords and no two posts get the
+        exact same keyword set while an unused combination remains.
+        
+        Returns:
+            List of keyword selections, one per post
+        """
+        if not keywords:
+            return [[] for _ in range(num_posts)]
+        
+        pool = list(keywords)
+        rng.shuffle(pool)
+        
+        plan = []
+        used_sets = set()
+        cursor = 0
+        for _ in range(num_posts):
+            num_keywords = rng.randint(1, min(3, len(pool)))
+            # Advance past combinations that were already planned
+            for _ in range(len(pool)):
+                selected = [pool[(cursor + j) % len(pool)] for j in range(num_keywords)]
+                key = frozenset(kw.keyword_id for kw in selected)
+                if key not in used_sets:
+                    break
+                cursor += 1
+            used_sets.add(key)
+            plan.append(selected)
+            cursor += num_keywords
+        
+        return plan
+    
+    def _batch_jobs(self, jobs: List[PostJob]) -> List[List[int]]:
+        """
+        Group post jobs into batches of up to batch_size.
+        
+        Jobs are grouped by persona so each request shares one persona frame.
+        
+        Returns:
+            List of job index lists
+        """
+        by_persona: Dict[str, List[int]] = {}
+        for i, job in enumerate(jobs):
+            by_persona.setdefault(job.persona.username, []).append(i)
+        
+        batch_size = max(1, self.batch_size)
+        batches = []
+        for indices in by_persona.values():
+            for start in range(0, len(indices), batch_size):
+                batches.append(indices[start:start + batch_size])
+        return batches
+    
+    async def _generate_post_batch(
+        self,
+        request: CalendarRequest,
+        indices: List[int],
+        jobs: List[PostJob],
+        used_samples: Set[int]
+    ) -> List[dict]:
+        """Generate one batch of planned posts, adding slot context to any failure."""
+        batch = [jobs[i] for i in indices]
+        try:
+            return await self.content_generator.agenerate_posts_batch(request.company_info, batch, used_samples)
+        except Exception as e:
+            # Groq failed - return error with helpful message
+            error_msg = str(e)
+            slots = ", ".join(str(i + 1) for i in indices)
+            raise Exception(
+                f"Failed to generate posts {slots}/{request.posts_per_week} for {batch[0].persona.name}. "
+                f"Groq API error: {error_msg}. "
+                f"Please check your GROQ_API_KEY in .env file and verify it's valid at https://console.groq.com/"
+            )
+    
+    def generate_next_week(
+        self,
+        request: CalendarRequest,
+        current_week_start: datetime,
+        batch: Optional[bool] = None
+    ) -> CalendarResponse:
         """
         Generate calendar for the next week.
         
         Args:
             request: Original CalendarRequest
             current_week_start: Start of current week
+            batch: Use the Groq Batch API, for weeks generated well in advance
             
         Returns:
             CalendarResponse for next week
         """
+        return asyncio.run(self.agenerate_next_week(request, current_week_start, batch=batch))
+    
+    async def agenerate_next_week(
+        self,
+        request: CalendarRequest,
+        current_week_start: datetime,
+        batch: Optional[bool] = None
+    ) -> CalendarResponse:
+        """Async variant of generate_next_week."""
         # Set week_start to next week
         next_week_start = current_week_start + timedelta(days=7)
         request.week_start = next_week_start
         
-        return self.generate_calendar(request)
+        return await self.agenerate_calendar(request, batch=batch)
 
@@ -4,113 +4,533 @@ Content generation engine using Groq API (OpenAI-compatible).
 import os
 import json
 import re
-from typing import List, Optional
-from openai import OpenAI
+import asyncio
+import hashlib
+import itertools
+import random
+import logging
+import threading
+import httpx
+import json_repair
+import numpy as np
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from models import CompanyInfo, Persona, Post, ContentType
+from models import CompanyInfo, Persona, Post, PostJob, ReplyJob, ContentType
+from llm_cache import LLMCache, SemanticCache, cache_key
+from batch_client import BatchClient, BatchQueue
 
-# Load .env file with explicit path and encoding
-env_path = os.path.join(os.path.dirname(__file__), '.env')
-if os.path.exists(env_path):
-    load_dotenv(dotenv_path=env_path, override=True)
-else:
-    # Try loading from current directory
-    load_dotenv(override=True)
+# Load .env once at import; variables already set in the environment win
+load_dotenv(override=False)
 
-class ContentGenerator:
-    """Generates natural Reddit posts and replies using Groq API."""
+logger = logging.getLogger(__name__)
+
+# Ask Groq to guarantee a syntactically valid JSON object
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+REPLY_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a helpful assistant that generates natural, authentic Reddit replies. Return only the reply text, no formatting."
+}
+
+# Connection pool for concurrent Groq calls; HTTP/2 multiplexes requests
+# over a few TLS connections instead of opening one per request
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# Process-wide Groq client, built lazily so every ContentGenerator shares
+# one HTTP connection pool
+_CLIENT: Optional[AsyncOpenAI] = None
+_CLIENT_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_CLIENT_LOCK = threading.Lock()
+
+# Cap on in-flight Groq requests across all calendars being generated,
+# to stay under the account's rate limits
+MAX_CONCURRENT_REQUESTS = int(os.getenv("GROQ_MAX_CONCURRENCY", "20"))
+_REQUEST_LIMITS: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+
+
+def create_client() -> AsyncOpenAI:
+    """
+    Build a Groq client with a pooled HTTP/2 connection.
+    
+    Raises:
+        ValueError: If GROQ_API_KEY is not set
+    """
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("GROQ_API_KEY not found in environment variables. Get a free key at https://console.groq.com/")
+    
+    # Initialize Groq client with OpenAI-compatible interface
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url="https://api.groq.com/openai/v1",
+        http_client=httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    )
+
+
+def _get_client() -> AsyncOpenAI:
+    """
+    Return the shared Groq client, creating it on first use.
+    
+    Pooled connections belong to the event loop that opened them, so the
+    client is rebuilt if the loop it was used on has since been closed
+    (e.g. between two asyncio.run calls from the sync wrappers).
+    """
+    global _CLIENT, _CLIENT_LOOP
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    
+    with _CLIENT_LOCK:
+        stale = _CLIENT_LOOP is not None and _CLIENT_LOOP is not loop and _CLIENT_LOOP.is_closed()
+        if _CLIENT is None or stale:
+            _CLIENT = create_client()
+            _CLIENT_LOOP = None
+        if loop is not None and _CLIENT_LOOP is None:
+            _CLIENT_LOOP = loop
+        return _CLIENT
+
+
+def _request_limit() -> asyncio.Semaphore:
+    """
+    Return the shared request semaphore for the running event loop.
+    
+    Semaphores are keyed by id(loop); entries for loops that have since
+    closed (e.g. finished asyncio.run calls) are evicted when a new loop
+    registers.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _REQUEST_LIMITS.get(id(loop))
+    if entry is None or entry[0] is not loop:
+        for key, (other, _) in list(_REQUEST_LIMITS.items()):
+            if other.is_closed():
+                _REQUEST_LIMITS.pop(key, None)
+        entry = _REQUEST_LIMITS[id(loop)] = (loop, asyncio.Semaphore(MAX_CONCURRENT_REQUESTS))
+    return entry[1]
+
+
+class _JsonObjectScanner:
+    """Incrementally finds where the first top-level JSON object in a stream ends."""
     
     def __init__(self):
-        # Try multiple ways to get the API key
-        api_key = os.getenv("GROQ_API_KEY")
-        
-        # If not found, try reading .env file directly from multiple locations
-        if not api_key:
-            # Try current directory first, then file's directory
-            current_dir = os.getcwd()
-            file_dir = os.path.dirname(os.path.abspath(__file__))
-            env_paths = [
-                os.path.join(current_dir, '.env'),
-                os.path.join(file_dir, '.env'),
-                '.env'
-            ]
-            for env_path in env_paths:
-                if os.path.exists(env_path):
-                    try:
-                        with open(env_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            for line in content.split('\n'):
-                                line = line.strip()
-                                if line and 'GROQ_API_KEY' in line and '=' in line:
-                                    parts = line.split('=', 1)
-                                    if len(parts) == 2:
-                                        api_key = parts[1].strip()
-                                        break
-                        if api_key:
-                            break
-                    except Exception as e:
-                        continue
-        
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables. Get a free key at https://console.groq.com/")
-        
-        # Initialize Groq client with OpenAI-compatible interface
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.groq.com/openai/v1",
-            http_client=None  # Avoid proxy issues
+        self.start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._pos = 0
+    
+    def feed(self, buffer: str) -> Optional[int]:
+        """Scan text appended since the last call; return the end index once the object closes."""
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self.start < 0:
+                if ch == "{":
+                    self.start = i
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pos = i + 1
+                    return i + 1
+        self._pos = len(buffer)
+        return None
+
+
+class StructuralCache:
+    """
+    Caches generated posts per prompt template (persona + company + subreddit).
+    
+    Only the query/keyword slots vary between otherwise identical post
+    prompts. Once min_samples posts exist for a template, new requests for
+    it are synthesized locally by swapping the new keywords into a stored
+    post instead of calling Groq. Callers pass a `used` set per calendar so
+    no sample fills two posts of the same week. Enable with STRUCTURAL_CACHE=1.
+    """
+    
+    def __init__(self, enabled: Optional[bool] = None, min_samples: int = 3, max_samples: int = 5):
+        if enabled is None:
+            enabled = os.getenv("STRUCTURAL_CACHE", "0") == "1"
+        self.enabled = enabled
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self._samples: Dict[str, List[dict]] = {}
+        self._sample_ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def template_key(*parts: str) -> str:
+        """Hash the fixed (non-slot) portions of a prompt."""
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    
+    def synthesize(self, key: str, keywords: List[str], used: Optional[Set[int]] = None) -> Optional[dict]:
+        """
+        Build a post from a stored sample for this template, or return None.
+        
+        Args:
+            key: Template key from template_key()
+            keywords: Keywords the new post should use
+            used: IDs of samples already used for this calendar; the chosen
+                sample's ID is added to it
+        """
+        if not self.enabled:
+            return None
+        
+        samples = self._samples.get(key, [])
+        if len(samples) < self.min_samples or not keywords:
+            self.misses += 1
+            return None
+        
+        # The sample needs a keyword to replace for every requested one
+        candidates = [
+            sample for sample in samples
+            if len(sample["keywords"]) >= len(keywords) and (used is None or sample["id"] not in used)
+        ]
+        if not candidates:
+            self.misses += 1
+            return None
+        
+        sample = random.choice(candidates)
+        replacements = {old.lower(): new for old, new in zip(sample["keywords"], keywords)}
+        # One pass, longest first and whole words only, so an inserted
+        # keyword is never replaced again
+        pattern = re.compile(
+            r"(?<!\w)(?:"
+            + "|".join(re.escape(old) for old in sorted(replacements, key=len, reverse=True))
+            + r")(?!\w)",
+            re.IGNORECASE
         )
+        found = set()
+        
+        def swap(match: re.Match) -> str:
+            old = match.group(0).lower()
+            found.add(old)
+            return replacements[old]
+        
+        title = pattern.sub(swap, sample["title"])
+        content = pattern.sub(swap, sample["content"])
+        
+        # Every requested keyword must land in the post, so the sample has
+        # to mention each keyword it's replacing verbatim
+        if len(found) < len(replacements) or len(replacements) < len(keywords):
+            self.misses += 1
+            return None
+        
+        if used is not None:
+            used.add(sample["id"])
+        self.hits += 1
+        return {"title": title, "content": content}
+    
+    def store(self, key: str, result: dict, keywords: List[str]) -> None:
+        """Remember a generated post for this template."""
+        if not self.enabled or not keywords:
+            return
+        
+        samples = self._samples.setdefault(key, [])
+        if len(samples) >= self.max_samples:
+            samples.pop(0)
+        samples.append({
+            "id": next(self._sample_ids),
+            "title": result["title"],
+            "content": result["content"],
+            "keywords": list(keywords)
+        })
+
+
+class ContentGenerator:
+    """Generates natural Reddit posts and replies using Groq API."""
+    
+    def __init__(self, client: Optional[AsyncOpenAI] = None):
+        """
+        Args:
+            client: Groq client owned by the caller (e.g. the app's lifespan);
+                defaults to the process-wide client from _get_client
+        """
+        self._client = client
+        if client is None:
+            _get_client()  # Fail fast if GROQ_API_KEY is missing
         self.model_name = "llama-3.3-70b-versatile"  # Updated to latest model per Groq docs
+        self.strong_model = self.model_name
+        self.fast_model = "llama-3.1-8b-instant"
+        # Try posts on the fast model first, escalating to the strong one
+        # when its output doesn't validate
+        self.tiered = os.getenv("GROQ_MODEL_TIERING", "0") == "1"
+        self.fast_min_success = 0.5  # Below this per-persona rate, go straight to strong
+        self._fast_stats: Dict[str, List[int]] = {}  # username -> [posts, attempts, successes]
+        self.cache = LLMCache()
+        self.structural_cache = StructuralCache()
+        self.post_cache = SemanticCache("post")
+        self.reply_cache = SemanticCache("reply", threshold=0.92)
+        self._req_template: Dict[str, Tuple[Persona, CompanyInfo, dict]] = {}
+        self.stream_json = os.getenv("GROQ_STREAM_JSON", "0") == "1"
+        self._batch_queues: Dict[int, BatchQueue] = {}  # id(loop) -> queue, dropped once idle
     
-    def generate_post(
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Injected Groq client, or the shared one (see _get_client)."""
+        return self._client or _get_client()
+    
+    async def _complete(
         self,
-        company: CompanyInfo,
-        persona: Persona,
-        subreddit: str,
-        query: str,
-        keywords: Optional[List[str]] = None,
-        existing_posts: Optional[List[Post]] = None
+        messages: List[dict],
+        temperature: float,
+        max_completion_tokens: int,
+        response_format: Optional[dict] = None,
+        model: Optional[str] = None,
+        accept: Optional[Callable[[str], bool]] = None
+    ) -> str:
+        """
+        Run a chat completion and return the stripped message text.
+        
+        Identical requests are served from the LLM cache when the cache
+        allows that temperature. A fresh response is only cached once
+        `accept` (if given) confirms the caller can use it, so a truncated
+        or malformed response isn't replayed.
+        """
+        model = model or self.model_name
+        cacheable = self.cache.allows(temperature)
+        if cacheable:
+            key = cache_key(model, messages, temperature, max_completion_tokens, response_format)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        body = self._request_body(messages, temperature, max_completion_tokens, response_format, model=model)
+        async with _request_limit():
+            if self.stream_json and response_format == JSON_RESPONSE_FORMAT:
+                content = await self._stream_json(body)
+            else:
+                response = await self.client.chat.completions.create(**body)
+                content = response.choices[0].message.content.strip()
+        
+        if cacheable and (accept is None or accept(content)):
+            self.cache.set(key, content)
+        return content
+    
+    def _request_body(
+        self,
+        messages: List[dict],
+        temperature: float,
+        max_completion_tokens: int,
+        response_format: Optional[dict] = None,
+        model: Optional[str] = None
     ) -> dict:
+        """Build chat completion parameters (also used as Batch API request bodies)."""
+        body = {
+            "model": model or self.model_name,
+            "messages": messages,
+            "temperature": temperature,
+            "max_completion_tokens": max_completion_tokens  # Using max_completion_tokens instead of deprecated max_tokens
+        }
+        if response_format:
+            body["response_format"] = response_format
+        return body
+    
+    async def _stream_json(self, body: dict) -> str:
         """
-        Generate a natural Reddit post based on company info, persona, and query.
+        Stream a JSON completion and stop as soon as the object is complete.
         
-        Args:
-            company: Company information
-            persona: Persona creating the post
-            subreddit: Target subreddit
-            query: ChatGPT query/topic to target
-            existing_posts: Existing posts to avoid topic overlap
-            
-        Returns:
-            dict with 'title' and 'content'
+        The response is scanned as it arrives; once the first top-level
+        object closes and parses, the stream is closed so no further tokens
+        are generated. Otherwise the whole response is returned for repair.
         """
-        # Build context about existing posts to avoid overlap
-        overlap_context = ""
-        if existing_posts:
-            recent_topics = [p.title for p in existing_posts[-3:]]
-            overlap_context = f"\n\nRecent post topics to avoid duplicating: {', '.join(recent_topics)}"
+        stream = await self.client.chat.completions.create(**body, stream=True)
+        buffer = ""
+        scanner = _JsonObjectScanner()
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                buffer += delta
+                if scanner is None:
+                    continue
+                end = scanner.feed(buffer)
+                if end is None:
+                    continue
+                candidate = buffer[scanner.start:end]
+                try:
+                    json.loads(candidate)
+                except json.JSONDecodeError:
+                    scanner = None  # Let it finish and leave it to the repair path
+                    continue
+                return candidate
+        finally:
+            await stream.close()
+        return buffer.strip()
+    
+    async def _complete_post(
+        self,
+        persona: Persona,
+        messages: List[dict],
+        max_completion_tokens: int,
+        accept: Callable[[str], bool]
+    ) -> str:
+        """
+        Run a JSON post completion, trying the fast model first when tiering is on.
         
-        # Build persona context
+        The fast model's response is kept if `accept` passes; otherwise (or
+        if the call fails) the request is repeated on the strong model.
+        Personas whose fast-model success rate falls below fast_min_success
+        skip straight to the strong model.
+        """
+        if self.tiered:
+            stats = self._fast_stats.setdefault(persona.username, [0, 0, 0])
+            stats[0] += 1
+        if self.tiered and self._use_fast_model(persona.username):
+            stats[1] += 1
+            try:
+                content = await self._complete(
+                    messages, 0.9, max_completion_tokens, JSON_RESPONSE_FORMAT,
+                    model=self.fast_model, accept=accept
+                )
+            except Exception as e:
+                logger.debug("Fast model call failed for %s, escalating: %s", persona.username, e)
+            else:
+                if accept(content):
+                    stats[2] += 1
+                    return content
+                logger.debug("Fast model output rejected for %s, escalating", persona.username)
+        
+        return await self._complete(
+            messages, 0.9, max_completion_tokens, JSON_RESPONSE_FORMAT,
+            model=self.strong_model, accept=accept
+        )
+    
+    def _use_fast_model(self, username: str) -> bool:
+        """Whether this persona's posts should be tried on the fast model."""
+        posts, attempts, successes = self._fast_stats.get(username, (0, 0, 0))
+        if attempts < 5:
+            return True
+        # Re-probe struggling personas every 10th post in case prompts improved
+        return successes / attempts >= self.fast_min_success or posts % 10 == 0
+    
+    def _is_valid_post(self, content: str) -> bool:
+        """Whether a single-post response parses into a usable post."""
+        try:
+            self._clean_post(self._load_json(content))
+        except ValueError:
+            return False
+        return True
+    
+    def _persona_context(self, persona: Persona) -> str:
+        """Build the persona section of a post prompt."""
         persona_context = f"""You are {persona.name} (Reddit username: {persona.username}), a {persona.role} with the following characteristics:
 - Voice: {persona.voice}
-- Interests: {', '.join(persona.interests)}
+- Interests: {persona.interests_csv}
 - Posting Style: {persona.posting_style}"""
         
         if persona.backstory:
-            persona_context += f"\n\nYour background: {persona.backstory[:500]}..."  # Truncate if too long
+            persona_context += f"\n\nYour background: {persona.backstory_short}..."
+        return persona_context
+    
+    def _company_context(self, company: CompanyInfo) -> str:
+        """Build the company section of a post prompt."""
+        return f"""Context about your domain (DO NOT directly promote, just use for context):
+- Company: {company.name} ({company.description})
+- Domain: {company.domain}
+- Target Audience: {company.target_audience_csv}"""
+    
+    def _post_system_message(self, persona: Persona, company: CompanyInfo) -> dict:
+        """
+        Return the system message for a persona's posts.
+        
+        The persona and company scaffolding is identical for every post a
+        persona writes, so it is built once per persona and kept first in
+        the request, where Groq can reuse it as a cached prompt prefix.
+        """
+        cached = self._req_template.get(persona.username)
+        if cached and cached[0] == persona and cached[1] == company:
+            return cached[2]
+        
+        system_prompt = f"""You are a helpful assistant that generates natural, authentic Reddit posts. Always return valid JSON only.
+
+{self._persona_context(persona)}
+
+{self._company_context(company)}"""
+        system_message = {"role": "system", "content": system_prompt}
+        self._req_template[persona.username] = (persona, company, system_message)
+        return system_message
+    
+    @staticmethod
+    def _strip_json_wrapper(content: str) -> str:
+        """Strip markdown fences and surrounding text from a JSON response."""
+        # Remove markdown code blocks if present
+        if content.startswith("```"):
+            parts = content.split("```")
+            if len(parts) > 1:
+                content = parts[1]
+                if content.startswith("json"):
+                    content = content[4:]
+        content = content.strip()
+        
+        # Try to extract JSON if wrapped in text
+        if "{" in content and "}" in content:
+            start = content.find("{")
+            end = content.rfind("}") + 1
+            content = content[start:end]
+        return content
+    
+    @classmethod
+    def _load_json(cls, content: str):
+        """Parse a JSON response, repairing it if the model returned malformed JSON."""
+        content = cls._strip_json_wrapper(content)
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            logger.warning("JSON parse failed, repairing response")
+            return json_repair.loads(content)
+    
+    @staticmethod
+    def _clean_post(result: dict) -> dict:
+        """Strip and validate a parsed post, raising ValueError if unusable."""
+        if not isinstance(result, dict):
+            raise ValueError("Could not extract title and content from response")
+        title = str(result.get("title", "")).strip()
+        post_content = str(result.get("content", "")).strip()
+        
+        # Validate we got actual content
+        if title and post_content and len(title) > 5 and len(post_content) > 10:
+            return {
+                "title": title,
+                "content": post_content
+            }
+        raise ValueError("Generated content too short or empty")
+    
+    def _post_prompt(
+        self,
+        persona: Persona,
+        subreddit: str,
+        query: str,
+        keywords: Optional[List[str]] = None,
+        avoid_topics: Optional[List[str]] = None
+    ) -> str:
+        """Build the user message for a single post."""
+        # Build context about other planned topics to avoid overlap
+        overlap_context = ""
+        if avoid_topics:
+            overlap_context = f"\n\nOther post topics this week to avoid duplicating: {'; '.join(avoid_topics)}"
         
         keyword_context = ""
         if keywords:
             keyword_context = f"\n\nTarget keywords to naturally incorporate: {', '.join(keywords)}"
         
-        prompt = f"""{persona_context}
-
-You are posting in r/{subreddit} about: {query}{keyword_context}
-
-Context about your domain (DO NOT directly promote, just use for context):
-- Company: {company.name} ({company.description})
-- Domain: {company.domain}
-- Target Audience: {', '.join(company.target_audience)}
+        prompt = f"""You are posting in r/{subreddit} about: {query}{keyword_context}
 
 Create a natural, engaging Reddit post that:
 1. Sounds like a real person asking a question or sharing an experience
@@ -130,9 +550,8 @@ Return ONLY a JSON object with this exact structure:
 
 Do not include any markdown formatting, just the raw JSON."""
 
-        try:
-            # Add instruction to return JSON only - be very explicit
-            full_prompt = prompt + """
+        # Add instruction to return JSON only - be very explicit
+        return prompt + """
 
 CRITICAL INSTRUCTIONS:
 - Return ONLY a valid JSON object
@@ -144,267 +563,434 @@ CRITICAL INSTRUCTIONS:
 {"title": "Your engaging question here", "content": "Your natural post content here in one paragraph"}
 
 Return the JSON now:"""
+    
+    def generate_post(
+        self,
+        company: CompanyInfo,
+        persona: Persona,
+        subreddit: str,
+        query: str,
+        keywords: Optional[List[str]] = None,
+        avoid_topics: Optional[List[str]] = None
+    ) -> dict:
+        """Synchronous wrapper around agenerate_post."""
+        return asyncio.run(self.agenerate_post(
+            company=company,
+            persona=persona,
+            subreddit=subreddit,
+            query=query,
+            keywords=keywords,
+            avoid_topics=avoid_topics
+        ))
+    
+    async def agenerate_post(
+        self,
+        company: CompanyInfo,
+        persona: Persona,
+        subreddit: str,
+        query: str,
+        keywords: Optional[List[str]] = None,
+        avoid_topics: Optional[List[str]] = None,
+        used_samples: Optional[Set[int]] = None
+    ) -> dict:
+        """
+        Generate a natural Reddit post based on company info, persona, and query.
+        
+        Args:
+            company: Company information
+            persona: Persona creating the post
+            subreddit: Target subreddit
+            query: ChatGPT query/topic to target
+            avoid_topics: Topics planned for other posts, to avoid overlap
+            used_samples: Structural cache samples already used for this
+                calendar (see StructuralCache.synthesize)
             
+        Returns:
+            dict with 'title' and 'content'
+        """
+        system_message = self._post_system_message(persona, company)
+        
+        # Reuse a structurally identical post if the template has enough samples
+        template_key = self.structural_cache.template_key(system_message["content"], subreddit)
+        synthesized = self.structural_cache.synthesize(template_key, keywords or [], used_samples)
+        if synthesized:
+            return synthesized
+        
+        full_prompt = self._post_prompt(persona, subreddit, query, keywords, avoid_topics)
+        
+        # Reuse the post of an identical or near-identical earlier prompt
+        # from the same persona and company
+        cached_post, prompt_embedding = await self._alookup_post(full_prompt, system_message["content"])
+        if cached_post:
+            return cached_post
+        
+        try:
             # Generate content
-            print(f"🔵 Generating post: {persona.name} → r/{subreddit}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Calling Groq for post: model=%s persona=%s (%s) subreddit=r/%s query=%s",
+                    self.model_name, persona.name, persona.username, subreddit, query
+                )
             
             try:
                 # Call Groq API using OpenAI-compatible interface
-                print(f"\n{'='*80}")
-                print(f"🔵 CALLING GROQ API FOR POST")
-                print(f"  Model: {self.model_name}")
-                print(f"  Persona: {persona.name} ({persona.username})")
-                print(f"  Subreddit: r/{subreddit}")
-                print(f"  Query: {query}")
-                print(f"{'='*80}\n")
-                
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a helpful assistant that generates natural, authentic Reddit posts. Always return valid JSON only."
-                        },
-                        {
-                            "role": "user",
-                            "content": full_prompt
-                        }
-                    ],
-                    temperature=0.9,
-                    max_completion_tokens=600  # Using max_completion_tokens instead of deprecated max_tokens
+                content = await self._complete_post(
+                    persona,
+                    messages=[system_message, {"role": "user", "content": full_prompt}],
+                    max_completion_tokens=600,
+                    accept=self._is_valid_post
                 )
                 
-                # Extract content from response
-                content = response.choices[0].message.content.strip()
-                
-                print(f"✅ Groq response received ({len(content)} chars)")
-                print(f"   Content preview: {content[:150]}...\n")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Groq response received (%d chars): %s", len(content), content[:150])
                 
             except Exception as api_err:
                 # Handle errors
                 error_str = str(api_err)
-                print(f"\n{'='*80}")
-                print(f"ERROR: Groq API call failed!")
-                print(f"  Error: {api_err}")
                 
                 # Check for common error types
                 if "401" in error_str or "Unauthorized" in error_str:
-                    print(f"  🔧 SOLUTION: Check your GROQ_API_KEY in .env file")
-                    print(f"  Get a free key at: https://console.groq.com/")
+                    hint = "Check your GROQ_API_KEY in .env file. Get a free key at: https://console.groq.com/"
                 elif "429" in error_str or "rate limit" in error_str.lower():
-                    print(f"  ⚠️  Rate limit hit. Groq has generous free limits, try again in a moment.")
+                    hint = "Rate limit hit. Groq has generous free limits, try again in a moment."
                 elif "403" in error_str or "Forbidden" in error_str:
-                    print(f"  🔧 SOLUTION: Check your API key permissions at https://console.groq.com/")
-                
-                print(f"{'='*80}\n")
-                raise
-            
-            # Content extracted successfully
-            
-            # Remove markdown code blocks if present
-            if content.startswith("```"):
-                parts = content.split("```")
-                if len(parts) > 1:
-                    content = parts[1]
-                    if content.startswith("json"):
-                        content = content[4:]
-            content = content.strip()
-            
-            # Try to extract JSON if wrapped in text
-            if "{" in content and "}" in content:
-                start = content.find("{")
-                end = content.rfind("}") + 1
-                content = content[start:end]
-            
-            # Use regex to extract title and content directly if JSON parsing fails
-            # This handles cases where Grok returns malformed JSON with newlines
-            try:
-                result = json.loads(content)
-                # JSON parsed successfully
-            except json.JSONDecodeError as json_err:
-                print(f"⚠️  JSON parse failed, trying alternative extraction...")
-                # Try to extract using regex patterns
-                title_pattern = r'"title"\s*:\s*"([^"]+)"'
-                content_pattern = r'"content"\s*:\s*"([^"]+)"'
-                
-                # Try single-line extraction first
-                title_match = re.search(title_pattern, content.replace('\n', ' '))
-                content_match = re.search(content_pattern, content.replace('\n', ' '))
-                
-                if title_match and content_match:
-                    result = {
-                        "title": title_match.group(1),
-                        "content": content_match.group(1)
-                    }
+                    hint = "Check your API key permissions at https://console.groq.com/"
                 else:
-                    # Try multi-line extraction - look for title: and content: patterns
-                    title_pattern_alt = r'"title"\s*:\s*"([^"]*(?:"[^"]*")*[^"]*)"'
-                    content_pattern_alt = r'"content"\s*:\s*"([^"]*(?:"[^"]*")*[^"]*)"'
-                    
-                    # Try to find title and content even with newlines
-                    lines = content.split('\n')
-                    title_parts = []
-                    content_parts = []
-                    in_title = False
-                    in_content = False
-                    
-                    for line in lines:
-                        if '"title"' in line and ':' in line:
-                            in_title = True
-                            # Extract the part after :
-                            if ':' in line:
-                                title_part = line.split(':', 1)[1].strip()
-                                if title_part.startswith('"'):
-                                    title_parts.append(title_part)
-                        elif '"content"' in line and ':' in line:
-                            in_content = True
-                            in_title = False
-                            if ':' in line:
-                                content_part = line.split(':', 1)[1].strip()
-                                if content_part.startswith('"'):
-                                    content_parts.append(content_part)
-                        elif in_title and line.strip():
-                            title_parts.append(line.strip())
-                        elif in_content and line.strip():
-                            content_parts.append(line.strip())
-                        elif '}' in line:
-                            in_title = False
-                            in_content = False
-                    
-                    # Reconstruct title and content
-                    if title_parts:
-                        title_str = ' '.join(title_parts).strip()
-                        # Remove quotes if present
-                        if title_str.startswith('"') and title_str.endswith('"'):
-                            title_str = title_str[1:-1]
-                        elif title_str.startswith('"'):
-                            title_str = title_str[1:]
-                        if title_str.endswith(','):
-                            title_str = title_str[:-1].strip()
-                        if title_str.endswith('"'):
-                            title_str = title_str[:-1]
-                    else:
-                        title_str = ""
-                    
-                    if content_parts:
-                        content_str = ' '.join(content_parts).strip()
-                        # Remove quotes if present
-                        if content_str.startswith('"') and content_str.endswith('"'):
-                            content_str = content_str[1:-1]
-                        elif content_str.startswith('"'):
-                            content_str = content_str[1:]
-                        if content_str.endswith(','):
-                            content_str = content_str[:-1].strip()
-                        if content_str.endswith('"'):
-                            content_str = content_str[:-1]
-                    else:
-                        content_str = ""
-                    
-                    if title_str and content_str:
-                        result = {
-                            "title": title_str,
-                            "content": content_str
-                        }
-                    else:
-                        raise ValueError("Could not extract title and content from response")
-            title = result.get("title", "").strip()
-            post_content = result.get("content", "").strip()
+                    hint = ""
+                logger.error("Groq API call failed: %s %s", api_err, hint)
+                raise
             
-            # Validate we got actual content
-            if title and post_content and len(title) > 5 and len(post_content) > 10:
-                return {
-                    "title": title,
-                    "content": post_content
-                }
-            else:
-                raise ValueError("Generated content too short or empty")
+            result = self._load_json(content)
+            result = self._clean_post(result)
+            self.structural_cache.store(template_key, result, keywords or [])
+            await self.post_cache.astore(
+                full_prompt, prompt_embedding, json.dumps(result), system_message["content"]
+            )
+            return result
                 
-        except json.JSONDecodeError as e:
-            # If JSON parsing fails, try to extract title and content from text
-            print(f"JSON parsing error: {e}")
-            print(f"Response was: {content[:300]}")
+        except Exception as e:
+            # Log the full error for debugging
+            logger.error("Groq API failed - no post content generated: %s", e, exc_info=True)
             
-            # Try to extract title and content from the response text
-            title_match = None
-            content_match = None
+            # NO FALLBACK - Let the error propagate so it's clear Groq isn't working
+            raise Exception(f"Groq API failed: {e}. No content generated. Check your GROQ_API_KEY and API connection.")
+    
+    def generate_posts_batch(self, company: CompanyInfo, jobs: List[PostJob]) -> List[dict]:
+        """Synchronous wrapper around agenerate_posts_batch."""
+        return asyncio.run(self.agenerate_posts_batch(company, jobs))
+    
+    async def agenerate_posts_batch(
+        self,
+        company: CompanyInfo,
+        jobs: List[PostJob],
+        used_samples: Optional[Set[int]] = None
+    ) -> List[dict]:
+        """
+        Generate several posts for one persona in a single Groq request.
+        
+        The persona and company context is sent once, followed by one
+        numbered slot per job. Slots the model leaves out or gets wrong are
+        regenerated individually with agenerate_post.
+        
+        Args:
+            company: Company information
+            jobs: Planned posts, all for the same persona
+            used_samples: Structural cache samples already used for this
+                calendar; defaults to a set local to this batch
             
-            # Look for patterns like "title": "..." or Title: ...
-            import re
-            title_patterns = [
-                r'"title"\s*:\s*"([^"]+)"',
-                r'Title:\s*(.+)',
-                r'title:\s*(.+)',
-            ]
-            for pattern in title_patterns:
-                match = re.search(pattern, content, re.IGNORECASE)
-                if match:
-                    title_match = match.group(1).strip()
-                    break
+        Returns:
+            List of dicts with 'title' and 'content', in job order
+        """
+        if not jobs:
+            return []
+        persona = jobs[0].persona
+        if any(job.persona.username != persona.username for job in jobs):
+            raise ValueError("All jobs in a post batch must share the same persona")
+        if used_samples is None:
+            used_samples = set()
+        if len(jobs) == 1:
+            return [await self._agenerate_job(company, jobs[0], used_samples)]
+        
+        system_message = self._post_system_message(persona, company)
+        
+        # Serve what we can from the structural and semantic caches, batch the rest
+        results: List[Optional[dict]] = [None] * len(jobs)
+        template_keys = []
+        cache_prompts = []
+        embeddings = []
+        for i, job in enumerate(jobs):
+            template_key = self.structural_cache.template_key(system_message["content"], job.subreddit)
+            template_keys.append(template_key)
+            cache_prompts.append(None)
+            embeddings.append(None)
+            results[i] = self.structural_cache.synthesize(template_key, job.keywords, used_samples)
+            if results[i] is None and self.post_cache.enabled:
+                cache_prompts[i] = self._post_prompt(
+                    job.persona, job.subreddit, job.query, job.keywords or None, job.avoid_topics
+                )
+        
+        lookups = [i for i, prompt in enumerate(cache_prompts) if prompt is not None]
+        found = await asyncio.gather(*(self._alookup_post(cache_prompts[i], system_message["content"]) for i in lookups))
+        for i, (post, embedding) in zip(lookups, found):
+            results[i], embeddings[i] = post, embedding
+        pending = [i for i, post in enumerate(results) if post is None]
+        
+        if len(pending) > 1:
+            slots = []
+            for slot_num, i in enumerate(pending, start=1):
+                job = jobs[i]
+                slot = f"#{slot_num}: post in r/{job.subreddit} about: {job.query}"
+                if job.keywords:
+                    slot += f"\n   Target keywords to naturally incorporate: {', '.join(job.keywords)}"
+                if job.avoid_topics:
+                    slot += f"\n   Other post topics this week to avoid duplicating: {'; '.join(job.avoid_topics)}"
+                slots.append(slot)
+            slot_list = "\n".join(slots)
             
-            content_patterns = [
-                r'"content"\s*:\s*"([^"]+)"',
-                r'Content:\s*(.+)',
-            ]
-            for pattern in content_patterns:
-                match = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
-                if match:
-                    content_match = match.group(1).strip()
-                    break
+            prompt = f"""Write {len(pending)} separate Reddit posts, one for each slot below:
+{slot_list}
+
+Each post must:
+1. Sound like a real person asking a question or sharing an experience
+2. Be valuable to the community (not promotional)
+3. Relate to its slot's topic and differ clearly from the other slots
+4. Could naturally lead to discussions about tools/solutions in this space
+5. Not be an obvious advertisement
+6. Feel authentic and human-written, in YOUR voice as {persona.name}
+7. Not use generic phrases like "I'm looking for recommendations"
+
+Return ONLY a JSON object with this exact structure, one entry per slot in order:
+{{"posts": [{{"slot": 1, "title": "Your post title (engaging, question-based)", "content": "Your post content (2-4 sentences, natural conversation starter)"}}]}}
+
+No markdown code blocks, no explanations, no newlines inside string values."""
             
-            if title_match and content_match:
-                return {
-                    "title": title_match,
-                    "content": content_match
-                }
+            logger.debug("Generating %d posts in one request: %s", len(pending), persona.name)
             
-            # Last resort fallback
-            raise ValueError("Could not extract valid content from response")
+            def accept(content: str) -> bool:
+                # The fast model must fill every slot with a distinct title
+                posts = self._match_slots(content, len(pending))
+                titles = {post["title"].lower() for post in posts.values()}
+                return len(posts) == len(pending) and len(titles) == len(pending)
             
-        except Exception as e:
-            # Log the full error for debugging
-            import traceback
-            print(f"\n{'='*80}")
-            print(f"❌ CRITICAL: Groq API failed - NO CONTENT GENERATED")
-            print(f"  Error: {e}")
-            print(f"  This means Groq is NOT working!")
-            print(f"  Check the error above for details.")
-            print(f"{'='*80}\n")
-            traceback.print_exc()
+            try:
+                content = await self._complete_post(
+                    persona,
+                    messages=[system_message, {"role": "user", "content": prompt}],
+                    max_completion_tokens=len(pending) * 600,
+                    accept=accept
+                )
+                matched = self._match_slots(content, len(pending))
+            except Exception as e:
+                logger.warning("Batched post generation failed, falling back to single posts: %s", e)
+                matched = {}
             
-            # NO FALLBACK - Let the error propagate so it's clear Groq isn't working
-            raise Exception(f"Groq API failed: {e}. No content generated. Check your GROQ_API_KEY and API connection.")
+            stores = []
+            for slot_index, post in matched.items():
+                i = pending[slot_index]
+                results[i] = post
+                self.structural_cache.store(template_keys[i], post, jobs[i].keywords)
+                stores.append(self.post_cache.astore(
+                    cache_prompts[i], embeddings[i], json.dumps(post), system_message["content"]
+                ))
+            await asyncio.gather(*stores)
+        
+        # Regenerate anything the batch didn't cover, concurrently
+        missing = [i for i, post in enumerate(results) if post is None]
+        regenerated = await asyncio.gather(*(self._agenerate_job(company, jobs[i], used_samples) for i in missing))
+        for i, post in zip(missing, regenerated):
+            results[i] = post
+        
+        return results
     
-    def generate_reply(
+    async def _alookup_post(self, prompt: str, system_prompt: str) -> Tuple[Optional[dict], Optional[np.ndarray]]:
+        """Look up a post in the semantic cache (see SemanticCache.lookup)."""
+        cached, embedding = await self.post_cache.alookup(prompt, system_prompt)
+        if cached:
+            try:
+                return self._clean_post(json.loads(cached)), embedding
+            except ValueError:
+                pass
+        return None, embedding
+    
+    def _match_slots(self, content: str, num_slots: int) -> Dict[int, dict]:
+        """
+        Parse a batched post response into cleaned posts keyed by slot index.
+        
+        Entries with a bad slot number or unusable content are dropped; the
+        first valid entry for a slot wins.
+        """
+        parsed = self._load_json(content)
+        items = parsed.get("posts", []) if isinstance(parsed, dict) else parsed
+        if not isinstance(items, list):
+            return {}
+        
+        matched = {}
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            slot_num = item.get("slot", position + 1)
+            if not isinstance(slot_num, int) or not 1 <= slot_num <= num_slots:
+                continue
+            if slot_num - 1 in matched:
+                continue
+            try:
+                matched[slot_num - 1] = self._clean_post(item)
+            except ValueError:
+                continue
+        return matched
+    
+    async def _agenerate_job(
         self,
         company: CompanyInfo,
-        persona: Persona,
-        parent_post: Post,
-        thread_posts: List[Post],
-        subreddit: str
-    ) -> str:
+        job: PostJob,
+        used_samples: Optional[Set[int]] = None
+    ) -> dict:
+        """Generate a single planned post."""
+        return await self.agenerate_post(
+            company=company,
+            persona=job.persona,
+            subreddit=job.subreddit,
+            query=job.query,
+            keywords=job.keywords or None,
+            avoid_topics=job.avoid_topics,
+            used_samples=used_samples
+        )
+    
+    async def agenerate_posts_offline(
+        self,
+        company: CompanyInfo,
+        jobs: List[PostJob],
+        used_samples: Optional[Set[int]] = None
+    ) -> List[dict]:
         """
-        Generate a natural reply to a post.
+        Generate posts through the Groq Batch API.
+        
+        Cheaper than live calls but can take minutes or hours, so it's meant
+        for calendars generated ahead of time. Slots the batch job doesn't
+        fill (or the whole batch, if it fails) are regenerated live.
+        
+        Returns:
+            List of dicts with 'title' and 'content', in job order
+        """
+        bodies = []
+        for job in jobs:
+            system_message = self._post_system_message(job.persona, company)
+            prompt = self._post_prompt(job.persona, job.subreddit, job.query, job.keywords or None, job.avoid_topics)
+            bodies.append(self._request_body(
+                [system_message, {"role": "user", "content": prompt}],
+                temperature=0.9,
+                max_completion_tokens=600,
+                response_format=JSON_RESPONSE_FORMAT
+            ))
+        
+        contents = await self._run_batched(bodies, "posts")
+        
+        results: List[Optional[dict]] = []
+        for content in contents:
+            result = None
+            if content:
+                try:
+                    result = self._clean_post(self._load_json(content))
+                except ValueError:
+                    result = None
+            results.append(result)
+        
+        # Regenerate anything the batch didn't cover, concurrently
+        if used_samples is None:
+            used_samples = set()
+        missing = [i for i, post in enumerate(results) if post is None]
+        regenerated = await asyncio.gather(*(self._agenerate_job(company, jobs[i], used_samples) for i in missing))
+        for i, post in zip(missing, regenerated):
+            results[i] = post
+        return results
+    
+    async def agenerate_replies_offline(
+        self,
+        company: CompanyInfo,
+        jobs: List[ReplyJob],
+        max_concurrency: int = 8
+    ) -> List[Optional[str]]:
+        """
+        Generate replies through the Groq Batch API.
+        
+        Replies the batch job doesn't produce (or the whole batch, if it
+        fails) are regenerated live with agenerate_replies.
         
         Args:
             company: Company information
-            persona: Persona creating the reply
-            parent_post: The post being replied to
-            thread_posts: All posts in this thread (to avoid repetition)
-            subreddit: Target subreddit
+            jobs: Planned replies
+            max_concurrency: Max in-flight Groq requests for the live fallback
             
         Returns:
-            Reply content string
+            Reply text per job, in job order (None where generation failed)
+        """
+        bodies = [
+            self._request_body(
+                [REPLY_SYSTEM_MESSAGE, {"role": "user", "content": self._reply_prompt(
+                    company, job.persona, job.parent_post, job.thread_posts, job.parent_post.subreddit
+                )}],
+                temperature=0.8,
+                max_completion_tokens=300
+            )
+            for job in jobs
+        ]
+        
+        contents = await self._run_batched(bodies, "replies")
+        replies = [self._clean_reply(content) for content in contents]
+        
+        missing = [i for i, reply in enumerate(replies) if reply is None]
+        if missing:
+            regenerated = await self.agenerate_replies(
+                company, [jobs[i] for i in missing], max_concurrency=max_concurrency
+            )
+            for i, reply in zip(missing, regenerated):
+                replies[i] = reply
+        return replies
+    
+    async def _run_batched(self, bodies: List[dict], label: str) -> List[Optional[str]]:
+        """
+        Submit request bodies through the shared batch queue.
+        
+        Returns:
+            Message content per body, in order (None where the batch failed)
         """
+        loop_id = id(asyncio.get_running_loop())
+        queue = self._batch_queues.get(loop_id)
+        if queue is None:
+            queue = BatchQueue(BatchClient(self.client))
+            queue.on_idle = lambda: self._drop_batch_queue(loop_id, queue)
+            self._batch_queues[loop_id] = queue
+        
+        results = await asyncio.gather(*[queue.submit(body) for body in bodies], return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            logger.warning("Groq batch failed for %d %s: %s", len(errors), label, errors[0])
+        return [None if isinstance(r, Exception) else r for r in results]
+    
+    def _drop_batch_queue(self, loop_id: int, queue: BatchQueue) -> None:
+        # Only forget the queue if a newer one hasn't replaced it
+        if self._batch_queues.get(loop_id) is queue:
+            del self._batch_queues[loop_id]
+    
+    def _reply_prompt(
+        self,
+        company: CompanyInfo,
+        persona: Persona,
+        parent_post: Post,
+        thread_posts: List[Post],
+        subreddit: str
+    ) -> str:
+        """Build the user message for a reply."""
         thread_context = ""
         if thread_posts:
             thread_context = "\n\nExisting replies in this thread:\n"
             for tp in thread_posts:
-                if tp.content_type == ContentType.REPLY:
+                if tp.content_type is ContentType.REPLY:
                     thread_context += f"- {tp.content}\n"
         
         prompt = f"""You are {persona.name}, a {persona.role} with the following characteristics:
 - Voice: {persona.voice}
-- Interests: {', '.join(persona.interests)}
+- Interests: {persona.interests_csv}
 - Posting Style: {persona.posting_style}
 
 You are replying to this post in r/{subreddit}:
@@ -426,67 +1012,153 @@ Create a natural, helpful reply that:
 6. Feels like a real person contributing to the discussion
 
 Return ONLY the reply text (2-4 sentences), no JSON, no markdown, just the plain text reply."""
-
+        
+        return prompt + "\n\nIMPORTANT: Return ONLY the reply text, no JSON, no markdown, no explanations, just the plain text reply."
+    
+    @staticmethod
+    def _clean_reply(reply_text: Optional[str]) -> Optional[str]:
+        """Strip wrapping quotes from a reply; return None if it's unusable."""
+        # Clean up the reply (remove any markdown or extra formatting)
+        if reply_text:
+            if reply_text.startswith('"') and reply_text.endswith('"'):
+                reply_text = reply_text[1:-1]
+            if reply_text.startswith("'") and reply_text.endswith("'"):
+                reply_text = reply_text[1:-1]
+            
+            # Validate we got actual content
+            if reply_text and len(reply_text) > 10:
+                return reply_text
+        return None
+    
+    def generate_reply(
+        self,
+        company: CompanyInfo,
+        persona: Persona,
+        parent_post: Post,
+        thread_posts: List[Post],
+        subreddit: str
+    ) -> str:
+        """Synchronous wrapper around agenerate_reply."""
+        return asyncio.run(self.agenerate_reply(
+            company=company,
+            persona=persona,
+            parent_post=parent_post,
+            thread_posts=thread_posts,
+            subreddit=subreddit
+        ))
+    
+    async def agenerate_reply(
+        self,
+        company: CompanyInfo,
+        persona: Persona,
+        parent_post: Post,
+        thread_posts: List[Post],
+        subreddit: str
+    ) -> str:
+        """
+        Generate a natural reply to a post.
+        
+        Args:
+            company: Company information
+            persona: Persona creating the reply
+            parent_post: The post being replied to
+            thread_posts: All posts in this thread (to avoid repetition)
+            subreddit: Target subreddit
+            
+        Returns:
+            Reply content string
+        """
         # Generate reply
         reply_text = None
         
         try:
-            full_prompt = prompt + "\n\nIMPORTANT: Return ONLY the reply text, no JSON, no markdown, no explanations, just the plain text reply."
+            full_prompt = self._reply_prompt(company, persona, parent_post, thread_posts, subreddit)
+            
+            # Reuse the reply of a near-identical earlier prompt if we have one
+            cached_reply, prompt_embedding = await self.reply_cache.alookup(full_prompt)
+            if cached_reply:
+                return cached_reply
             
-            print(f"🔵 Generating reply: {persona.name} → r/{subreddit}")
+            logger.debug("Generating reply: %s -> r/%s", persona.name, subreddit)
             
             # Call Groq API using OpenAI-compatible interface
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that generates natural, authentic Reddit replies. Return only the reply text, no formatting."
-                    },
-                    {
-                        "role": "user",
-                        "content": full_prompt
-                    }
-                ],
+            reply_text = await self._complete(
+                messages=[REPLY_SYSTEM_MESSAGE, {"role": "user", "content": full_prompt}],
                 temperature=0.8,
-                max_completion_tokens=300  # Using max_completion_tokens instead of deprecated max_tokens
+                max_completion_tokens=300,
+                accept=lambda text: self._clean_reply(text) is not None
             )
             
-            # Extract reply from response
-            reply_text = response.choices[0].message.content.strip()
-            
-            print(f"✅ Groq reply received ({len(reply_text)} chars)")
-            print(f"   Reply preview: {reply_text[:100]}...\n")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Groq reply received (%d chars): %s", len(reply_text), reply_text[:100])
             
         except Exception as api_err:
             # Error - log it clearly, no fallback
-            import traceback
-            print(f"\n{'='*80}")
-            print(f"❌ CRITICAL: Groq API failed for reply")
-            print(f"  Error: {api_err}")
-            print(f"  This means Groq is NOT working!")
-            print(f"{'='*80}\n")
-            traceback.print_exc()
+            logger.error("Groq API failed for reply: %s", api_err, exc_info=True)
             reply_text = None
         
-        # Clean up the reply (remove any markdown or extra formatting)
+        reply_text = self._clean_reply(reply_text)
         if reply_text:
-            if reply_text.startswith('"') and reply_text.endswith('"'):
-                reply_text = reply_text[1:-1]
-            if reply_text.startswith("'") and reply_text.endswith("'"):
-                reply_text = reply_text[1:-1]
-            
-            # Validate we got actual content
-            if reply_text and len(reply_text) > 10:
-                return reply_text
+            await self.reply_cache.astore(full_prompt, prompt_embedding, reply_text)
+            return reply_text
         
         # NO FALLBACK - If API fails, return None so it's clear Groq isn't working
-        print(f"\n{'='*80}")
-        print(f"❌ CRITICAL: Groq API failed for reply - NO REPLY GENERATED")
-        print(f"  This means Groq is NOT working!")
-        print(f"  Check error messages above for details.")
-        print(f"{'='*80}\n")
+        logger.warning("No reply generated for %s in r/%s", persona.name, subreddit)
         
         # Return None instead of fallback - this will show as empty/missing in the calendar
         return None
 
+    
+    def generate_replies(
+        self,
+        company: CompanyInfo,
+        jobs: List[ReplyJob],
+        max_concurrency: int = 8
+    ) -> List[Optional[str]]:
+        """Synchronous wrapper around agenerate_replies."""
+        return asyncio.run(self.agenerate_replies(company, jobs, max_concurrency=max_concurrency))
+    
+    async def agenerate_replies(
+        self,
+        company: CompanyInfo,
+        jobs: List[ReplyJob],
+        max_concurrency: int = 8
+    ) -> List[Optional[str]]:
+        """
+        Generate replies for several posts in one concurrent wave.
+        
+        A reply that fails is logged and left as None; it doesn't affect the
+        other replies in the wave.
+        
+        Args:
+            company: Company information
+            jobs: Planned replies
+            max_concurrency: Max in-flight Groq requests
+            
+        Returns:
+            Reply text per job, in job order (None where generation failed)
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def bounded(job: ReplyJob) -> Optional[str]:
+            async with semaphore:
+                return await self.agenerate_reply(
+                    company=company,
+                    persona=job.persona,
+                    parent_post=job.parent_post,
+                    thread_posts=job.thread_posts,
+                    subreddit=job.parent_post.subreddit
+                )
+        
+        results = await asyncio.gather(*[bounded(job) for job in jobs], return_exceptions=True)
+        
+        replies = []
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                # Groq failed for reply - log but continue (replies are optional)
+                logger.warning("Failed to generate reply for post %s: %s", job.parent_post.id, result)
+                result = None
+            elif not result:
+                logger.warning("Skipping reply for post %s - Groq returned None", job.parent_post.id)
+            replies.append(result)
+        return replies
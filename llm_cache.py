@@ -0,0 +1,293 @@
+"""
+Caches for Groq chat completions.
+"""
+import os
+import json
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import diskcache
+import numpy as np
+
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+CACHE_EXPIRE_SECONDS = 7 * 86400  # One week
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", os.path.join(CACHE_DIR, "semantic.sqlite3"))
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+
+def cache_key(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_completion_tokens: int,
+    response_format: Optional[dict] = None
+) -> str:
+    """Return a stable SHA-256 key for a chat completion request."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_completion_tokens": max_completion_tokens,
+            "response_format": response_format
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-level (memory + disk) cache of completion text.
+
+    Sampled completions (temperature > 0) are only cached when
+    cache_sampled is enabled, since reusing them trades variety for speed.
+    """
+
+    def __init__(
+        self,
+        directory: str = CACHE_DIR,
+        expire: int = CACHE_EXPIRE_SECONDS,
+        cache_sampled: Optional[bool] = None,
+        max_memory_entries: int = 1024
+    ):
+        if cache_sampled is None:
+            cache_sampled = os.getenv("LLM_CACHE_SAMPLED", "0") == "1"
+        self.cache_sampled = cache_sampled
+        self.directory = directory
+        self.expire = expire
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._disk: Optional[diskcache.Cache] = None  # Opened on first use
+        self.hits = 0
+        self.misses = 0
+
+    def allows(self, temperature: float) -> bool:
+        """Whether a completion at this temperature may be cached."""
+        return temperature <= 0 or self.cache_sampled
+
+    def get(self, key: str) -> Optional[str]:
+        """Return cached completion text, or None on a miss."""
+        value = self._memory.get(key)
+        if value is None:
+            value = self._disk_cache().get(key)
+            if value is not None:
+                self._remember(key, value)
+        else:
+            self._memory.move_to_end(key)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store completion text in memory and on disk."""
+        self._remember(key, value)
+        self._disk_cache().set(key, value, expire=self.expire)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters."""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _disk_cache(self) -> diskcache.Cache:
+        if self._disk is None:
+            self._disk = diskcache.Cache(self.directory)
+        return self._disk
+
+    def _remember(self, key: str, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+
+class SemanticCache:
+    """
+    Reuses completions for identical or near-duplicate prompts.
+
+    A prompt may come with a `context` (e.g. a persona's system message)
+    that is the same for many prompts. Lookups first try an exact match on
+    the SHA-256 of context and prompt, which needs no embedding. Otherwise
+    only the prompt is embedded locally with a MiniLM sentence-transformer
+    (loaded on first use), since a long shared context would crowd the
+    varying part out of the model's 256-token window, and it is compared
+    against stored prompts with the same context in this namespace; a
+    cosine similarity of at least `threshold` returns the stored response
+    without a Groq call.
+    Entries are kept in SQLite at `path` between runs; embeddings live in
+    preallocated matrices that double when full.
+    Enable with SEMANTIC_CACHE=1 (requires sentence-transformers).
+
+    alookup() and astore() run the SQLite queries and embedding in a worker
+    thread so they don't block the event loop.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        path: str = SEMANTIC_CACHE_PATH,
+        threshold: float = 0.95,
+        enabled: Optional[bool] = None,
+        model_name: str = "all-MiniLM-L6-v2"
+    ):
+        if enabled is None:
+            enabled = os.getenv("SEMANTIC_CACHE", "0") == "1"
+        self.enabled = enabled
+        self.namespace = namespace
+        self.path = path
+        self.threshold = threshold
+        self.model_name = model_name
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, _EmbeddingIndex] = {}  # context_hash -> stored prompts
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            self._load()
+
+    def lookup(self, prompt: str, context: str = "") -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Find a stored response for the same or a similar prompt.
+
+        Args:
+            prompt: The part of the prompt that varies between requests
+            context: Shared text sent with it; only exact matches count
+
+        Returns:
+            (response or None, prompt embedding to pass to store())
+        """
+        if not self.enabled:
+            return None, None
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, embedding FROM entries WHERE namespace = ? AND prompt_hash = ?",
+                (self.namespace, _sha256(f"{context}\n\n{prompt}"))
+            ).fetchone()
+        if row:
+            self.hits += 1
+            return row[0], np.frombuffer(row[1], dtype=np.float32)
+
+        embedding = self._embed(prompt)
+        with self._lock:
+            index = self._indexes.get(_sha256(context))
+            response = index.nearest(embedding, self.threshold) if index else None
+        if response is not None:
+            self.hits += 1
+            return response, embedding
+
+        self.misses += 1
+        return None, embedding
+
+    def store(self, prompt: str, embedding: Optional[np.ndarray], response: str, context: str = "") -> None:
+        """Remember a generated response under its prompt, context and embedding."""
+        if not self.enabled or embedding is None:
+            return
+        prompt_hash = _sha256(f"{context}\n\n{prompt}")
+        context_hash = _sha256(context)
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "(namespace, prompt_hash, context_hash, prompt, response, embedding) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        self.namespace, prompt_hash, context_hash, prompt, response,
+                        embedding.astype(np.float32).tobytes()
+                    )
+                )
+            self._indexes.setdefault(context_hash, _EmbeddingIndex()).put(prompt_hash, embedding, response)
+
+    async def alookup(self, prompt: str, context: str = "") -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """lookup() without blocking the event loop."""
+        if not self.enabled:
+            return None, None
+        return await asyncio.to_thread(self.lookup, prompt, context)
+
+    async def astore(
+        self,
+        prompt: str,
+        embedding: Optional[np.ndarray],
+        response: str,
+        context: str = ""
+    ) -> None:
+        """store() without blocking the event loop."""
+        if not self.enabled or embedding is None:
+            return
+        await asyncio.to_thread(self.store, prompt, embedding, response, context)
+
+    def _embed(self, text: str) -> np.ndarray:
+        embedding = _embedder(self.model_name).encode([text], normalize_embeddings=True)[0]
+        return np.asarray(embedding, dtype=np.float32)
+
+    def _load(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        if columns and "context_hash" not in columns:
+            # Older entries embedded context and prompt together, so they can't be compared
+            self._db.execute("DROP TABLE entries")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, prompt_hash TEXT NOT NULL, context_hash TEXT NOT NULL, "
+            "prompt TEXT NOT NULL, response TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "PRIMARY KEY (namespace, prompt_hash))"
+        )
+        rows = self._db.execute(
+            "SELECT prompt_hash, context_hash, response, embedding FROM entries WHERE namespace = ?",
+            (self.namespace,)
+        ).fetchall()
+        for prompt_hash, context_hash, response, blob in rows:
+            index = self._indexes.setdefault(context_hash, _EmbeddingIndex())
+            index.put(prompt_hash, np.frombuffer(blob, dtype=np.float32), response)
+
+
+class _EmbeddingIndex:
+    """Unit-vector embeddings and their responses, in a matrix that doubles when full."""
+
+    def __init__(self):
+        self._buffer = np.zeros((16, EMBEDDING_DIM), dtype=np.float32)
+        self._size = 0
+        self._responses: List[str] = []
+        self._rows: Dict[str, int] = {}  # prompt_hash -> row in _buffer
+
+    def nearest(self, embedding: np.ndarray, threshold: float) -> Optional[str]:
+        """Return the response of the most similar row if it reaches threshold."""
+        if not self._size:
+            return None
+        scores = self._buffer[:self._size] @ embedding  # Rows are unit vectors, so this is cosine
+        best = int(np.argmax(scores))
+        return self._responses[best] if scores[best] >= threshold else None
+
+    def put(self, prompt_hash: str, embedding: np.ndarray, response: str) -> None:
+        index = self._rows.get(prompt_hash)
+        if index is not None:
+            # Concurrent misses on the same prompt replace the row rather than duplicating it
+            self._buffer[index] = embedding
+            self._responses[index] = response
+            return
+        if self._size == len(self._buffer):
+            grown = np.zeros((2 * len(self._buffer), EMBEDDING_DIM), dtype=np.float32)
+            grown[:self._size] = self._buffer[:self._size]
+            self._buffer = grown
+        self._buffer[self._size] = embedding
+        self._rows[prompt_hash] = self._size
+        self._responses.append(response)
+        self._size += 1
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _embedder(model_name: str):
+    """Load a sentence-transformer once per process, shared by all caches."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
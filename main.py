@@ -3,22 +3,128 @@ FastAPI application for Reddit Mastermind content calendar generator.
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
-import json
+import atexit
+import logging
 import os
+import queue
+import orjson
 
 from models import CalendarRequest, CalendarResponse, CompanyInfo, Persona, Keyword
 from dotenv import load_dotenv
 
 # Load environment variables before importing CalendarGenerator
-load_dotenv(override=True)
+load_dotenv(override=False)
 
 from calendar_generator import CalendarGenerator
+from content_generator import create_client
 
-app = FastAPI(title="Reddit Mastermind", version="1.0.0")
+def configure_logging() -> Optional[QueueListener]:
+    """
+    Route log records through a queue to a background stderr writer.
+    
+    Request handlers only enqueue records; formatting and writing happen on
+    the listener's thread. The level comes from LOG_LEVEL (default WARNING).
+    Does nothing if the root logger already has a QueueHandler, since this
+    module is imported a second time as `main` when served by uvicorn.
+    
+    Returns:
+        The started listener, or None if logging was already configured
+    """
+    root = logging.getLogger()
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return None
+    
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    root.setLevel(os.getenv("LOG_LEVEL", "WARNING").upper())
+    root.addHandler(QueueHandler(log_queue))
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Flush queued records on exit
+    return listener
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+def load_sample_data() -> dict:
+    """Load and validate the sample company data."""
+    # Load from JSON file
+    sample_data_path = os.path.join("data", "sample_company.json")
+    try:
+        with open(sample_data_path, "rb") as f:
+            data = orjson.loads(f.read())
+        
+        # Convert to Pydantic models
+        company_info = CompanyInfo.model_validate(data["company_info"])
+        personas = [Persona.model_validate(p) for p in data["personas"]]
+        keywords = [Keyword.model_validate(k) for k in data["keywords"]]
+        
+        return {
+            "company_info": company_info.model_dump(),
+            "personas": [p.model_dump() for p in personas],
+            "subreddits": data["subreddits"],
+            "keywords": [k.model_dump() for k in keywords],
+            "posts_per_week": data["posts_per_week"]
+        }
+    except FileNotFoundError:
+        # Fallback to hardcoded data
+        sample_company = CompanyInfo(
+            name="Slideforge",
+            website="slideforge.ai",
+            description="AI-powered presentation tool",
+            target_audience=["operators", "consultants", "founders"],
+            key_features=["AI-powered", "Templates", "API"],
+            domain="presentation tools"
+        )
+        
+        sample_personas = [
+            Persona(
+                name="Riley Hart",
+                username="riley_ops",
+                role="Head of Operations",
+                voice="Precise, organized",
+                interests=["operations", "process design"],
+                posting_style="Thoughtful, shares experiences"
+            )
+        ]
+        
+        sample_keywords = [
+            Keyword(keyword_id="K1", keyword="best ai presentation maker")
+        ]
+        
+        return {
+            "company_info": sample_company.model_dump(),
+            "personas": [p.model_dump() for p in sample_personas],
+            "subreddits": ["PowerPoint", "startups"],
+            "keywords": [k.model_dump() for k in sample_keywords],
+            "posts_per_week": 3
+        }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sample data never changes while the server runs, so build it once
+    app.state.sample_data = load_sample_data()
+    
+    # One Groq client (and connection pool) for the lifetime of the server
+    app.state.groq = create_client()
+    app.state.generator = CalendarGenerator(client=app.state.groq)
+    yield
+    await app.state.groq.close()
+
+app = FastAPI(
+    title="Reddit Mastermind",
+    version="1.0.0",
+    lifespan=lifespan
+)
 
 # CORS middleware
 app.add_middleware(
@@ -33,9 +139,6 @@ app.add_middleware(
 if os.path.exists("static"):
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Initialize generator
-generator = CalendarGenerator()
-
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     """Serve the main HTML page."""
@@ -65,36 +168,25 @@ async def generate_calendar(request: CalendarRequest):
         CalendarResponse with generated calendar
     """
     try:
-        print(f"\n{'='*80}")
-        print(f"📥 RECEIVED CALENDAR GENERATION REQUEST")
-        print(f"  Company: {request.company_info.name}")
-        print(f"  Personas: {len(request.personas)}")
-        print(f"  Subreddits: {len(request.subreddits)}")
-        print(f"  Keywords: {len(request.keywords)}")
-        print(f"  Posts per week: {request.posts_per_week}")
-        print(f"{'='*80}\n")
+        logger.info(
+            "Received calendar request: company=%s personas=%d subreddits=%d keywords=%d posts_per_week=%d",
+            request.company_info.name, len(request.personas), len(request.subreddits),
+            len(request.keywords), request.posts_per_week
+        )
         
-        response = generator.generate_calendar(request)
+        response = await app.state.generator.agenerate_calendar(request)
         
-        print(f"\n{'='*80}")
-        print(f"✅ CALENDAR GENERATED SUCCESSFULLY")
-        print(f"  Total entries: {len(response.calendar.entries)}")
-        print(f"  Quality score: {response.quality_score}/10")
-        print(f"{'='*80}\n")
+        logger.info(
+            "Calendar generated: %d entries, quality score %s/10",
+            len(response.calendar.entries), response.quality_score
+        )
         
         return response
     except Exception as e:
-        import traceback
         error_msg = str(e)
-        error_traceback = traceback.format_exc()
         
-        # Log full error to server console
-        print(f"\n{'='*80}")
-        print(f"❌ ERROR GENERATING CALENDAR")
-        print(f"  Error: {error_msg}")
-        print(f"  Full traceback:")
-        print(f"{error_traceback}")
-        print(f"{'='*80}\n")
+        # Log full error (with traceback) to server console
+        logger.exception("Error generating calendar: %s", error_msg)
         
         # Provide more helpful error message to client
         if "GROQ_API_KEY" in error_msg or "Groq API" in error_msg:
@@ -104,7 +196,26 @@ async def generate_calendar(request: CalendarRequest):
         
         raise HTTPException(status_code=500, detail=detail_msg)
 
-@app.post("/api/generate-next-week")
+@app.post("/api/generate-calendar/stream")
+async def stream_calendar(request: CalendarRequest):
+    """
+    Generate a content calendar as a Server-Sent Events stream.
+    
+    Emits an `entry` event (a CalendarEntry) for each post as soon as it is
+    generated, then for each reply, and finally a `done` event with the
+    full CalendarResponse. Failures are reported as an `error` event.
+    """
+    async def events():
+        try:
+            async for event, payload in app.state.generator.astream_calendar(request):
+                yield f"event: {event}\ndata: {orjson.dumps(payload.model_dump()).decode()}\n\n"
+        except Exception as e:
+            logger.exception("Error streaming calendar")
+            yield f"event: error\ndata: {orjson.dumps({'detail': f'Calendar Generation Failed: {e}'}).decode()}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/api/generate-next-week", response_model=CalendarResponse)
 async def generate_next_week(data: dict):
     """
     Generate calendar for the next week.
@@ -116,70 +227,30 @@ async def generate_next_week(data: dict):
         CalendarResponse for next week
     """
     try:
-        request = CalendarRequest(**data["request"])
+        request = CalendarRequest.model_validate(data["request"])
         week_start_str = data["current_week_start"]
         week_start = datetime.fromisoformat(week_start_str.replace("Z", "+00:00"))
-        response = generator.generate_next_week(request, week_start)
+        response = await app.state.generator.agenerate_next_week(request, week_start)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sample-data")
 async def get_sample_data():
-    """Return sample data for testing."""
-    # Load from JSON file
-    sample_data_path = os.path.join("data", "sample_company.json")
-    try:
-        with open(sample_data_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        # Convert to Pydantic models
-        company_info = CompanyInfo(**data["company_info"])
-        personas = [Persona(**p) for p in data["personas"]]
-        keywords = [Keyword(**k) for k in data["keywords"]]
-        
-        return {
-            "company_info": company_info.dict(),
-            "personas": [p.dict() for p in personas],
-            "subreddits": data["subreddits"],
-            "keywords": [k.dict() for k in keywords],
-            "posts_per_week": data["posts_per_week"]
-        }
-    except FileNotFoundError:
-        # Fallback to hardcoded data
-        sample_company = CompanyInfo(
-            name="Slideforge",
-            website="slideforge.ai",
-            description="AI-powered presentation tool",
-            target_audience=["operators", "consultants", "founders"],
-            key_features=["AI-powered", "Templates", "API"],
-            domain="presentation tools"
-        )
-        
-        sample_personas = [
-            Persona(
-                name="Riley Hart",
-                username="riley_ops",
-                role="Head of Operations",
-                voice="Precise, organized",
-                interests=["operations", "process design"],
-                posting_style="Thoughtful, shares experiences"
-            )
-        ]
-        
-        sample_keywords = [
-            Keyword(keyword_id="K1", keyword="best ai presentation maker")
-        ]
-        
-        return {
-            "company_info": sample_company.dict(),
-            "personas": [p.dict() for p in sample_personas],
-            "subreddits": ["PowerPoint", "startups"],
-            "keywords": [k.dict() for k in sample_keywords],
-            "posts_per_week": 3
-        }
+    """Return sample data for testing (loaded once at startup)."""
+    return app.state.sample_data
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvicorn[standard] installs uvloop and httptools, which uvicorn's "auto"
+    # loop and http settings pick up (falling back on Windows, where
+    # uvloop isn't available)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )
 
@@ -1,7 +1,8 @@
 """
 Data models for Reddit Mastermind content calendar system.
 """
-from pydantic import BaseModel, Field
+from functools import cached_property
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
 from enum import Enum
@@ -14,6 +15,9 @@ class ContentType(str, Enum):
 
 class Persona(BaseModel):
     """Represents a persona with distinct voice and characteristics."""
+    # Frozen so the cached prompt strings below can't go stale
+    model_config = ConfigDict(frozen=True)
+    
     name: str
     username: str  # Reddit username (e.g., riley_ops)
     role: str
@@ -21,16 +25,34 @@ class Persona(BaseModel):
     interests: List[str]
     posting_style: str
     backstory: Optional[str] = None  # Full persona backstory/description
+    
+    @cached_property
+    def backstory_short(self) -> str:
+        """Backstory truncated for use in prompts."""
+        return (self.backstory or "")[:500]
+    
+    @cached_property
+    def interests_csv(self) -> str:
+        """Interests joined for use in prompts."""
+        return ', '.join(self.interests)
 
 
 class CompanyInfo(BaseModel):
     """Company information for content generation."""
+    # Frozen so the cached prompt strings below can't go stale
+    model_config = ConfigDict(frozen=True)
+    
     name: str
     website: str
     description: str
     target_audience: List[str]
     key_features: List[str]
     domain: str  # Main domain/topic area
+    
+    @cached_property
+    def target_audience_csv(self) -> str:
+        """Target audience joined for use in prompts."""
+        return ', '.join(self.target_audience)
 
 
 class Keyword(BaseModel):
@@ -41,6 +63,9 @@ class Keyword(BaseModel):
 
 class Post(BaseModel):
     """A Reddit post."""
+    # Built in bulk by the scheduler and never modified afterwards
+    model_config = ConfigDict(extra="forbid", frozen=True, from_attributes=True)
+    
     id: str
     date: datetime
     persona: str
@@ -55,8 +80,27 @@ class Post(BaseModel):
     keyword_ids: List[str] = Field(default_factory=list)  # e.g., ["K1", "K14", "K4"]
 
 
+class PostJob(BaseModel):
+    """A planned post waiting for content generation."""
+    persona: Persona
+    subreddit: str
+    query: str
+    keywords: List[str] = Field(default_factory=list)
+    keyword_ids: List[str] = Field(default_factory=list)
+    avoid_topics: List[str] = Field(default_factory=list)  # Topics planned for other posts
+
+
+class ReplyJob(BaseModel):
+    """A planned reply waiting for content generation."""
+    persona: Persona
+    parent_post: Post
+    thread_posts: List[Post] = Field(default_factory=list)  # Posts in the same thread, for context
+
+
 class CalendarEntry(BaseModel):
     """A single entry in the content calendar."""
+    model_config = ConfigDict(extra="forbid", frozen=True, from_attributes=True)
+    
     post_id: Optional[str] = None  # e.g., P1, P2, P3
     comment_id: Optional[str] = None  # e.g., C1, C2, C3
     date: datetime
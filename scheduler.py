@@ -1,26 +1,109 @@
 """
 Scheduling and distribution algorithm for content calendar.
 """
+from collections import defaultdict
 from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import attrgetter
 from typing import List, Dict, Optional
+import heapq
 import random
 from models import Post, ContentType, CalendarEntry, ContentCalendar, CompanyInfo, Persona
 
+POSTING_HOURS = (9, 11, 14, 16, 18)  # Business hours for posting
+
+# (day offset, hour) posting slots for a week starting on each weekday,
+# skipping weekends for better engagement
+_SLOT_TEMPLATES = {
+    start_weekday: tuple(
+        (day_offset, hour)
+        for day_offset in range(7)
+        if (start_weekday + day_offset) % 7 < 5  # Monday-Friday
+        for hour in POSTING_HOURS
+    )
+    for start_weekday in range(7)
+}
+
+
+@lru_cache(maxsize=512)
+def _fmt_time(hour: int, minute: int) -> str:
+    """Format a time of day as e.g. "09:05 AM" (memoized; calendars reuse few distinct times)."""
+    return datetime(2000, 1, 1, hour, minute).strftime("%I:%M %p")
+
+
+# Simple fallback responses for nested replies that sound natural
+_NESTED_REPLIES = (
+    "Thanks for sharing! I've had similar experiences.",
+    "Great point! I've found this helpful too.",
+    "This is exactly what I needed to hear.",
+    "Same here! This has been a game changer for me.",
+    "Appreciate the insight! Going to try this out.",
+    "This resonates with me. Thanks for the tip!"
+)
+
 
 class Scheduler:
-    """Handles scheduling and distribution of posts and replies."""
+    """
+    Handles scheduling and distribution of posts and replies.
+    
+    All random choices come from `rng` (the global `random` module by
+    default), so passing a seeded random.Random makes slots, subreddit and
+    persona assignment, and reply timing reproducible.
+    """
     
     def __init__(
         self,
         posts_per_week: int,
         subreddits: List[str],
-        personas: List[Persona]
+        personas: List[Persona],
+        rng: Optional[random.Random] = None
     ):
+        self.rng = rng or random
         self.posts_per_week = posts_per_week
         self.subreddits = subreddits
         self.personas = personas
+        self.personas_by_username = {p.username: p for p in personas}
+        self._persona_set = set(self.personas_by_username)
         self.max_posts_per_subreddit = max(1, posts_per_week // len(subreddits) + 1)
     
+    def plan_slots(self, week_start: datetime, num_posts: int) -> List[datetime]:
+        """
+        Pick posting times across the week, before any content exists.
+        
+        Args:
+            week_start: Start of the week
+            num_posts: Number of posts to place
+            
+        Returns:
+            Chronological post times (at most one per available slot)
+        """
+        # Distribute posts across weekdays; datetimes are only built for the
+        # slots actually picked
+        weekday_slots = _SLOT_TEMPLATES[week_start.weekday()]
+        selected_slots = self.rng.sample(weekday_slots, min(num_posts, len(weekday_slots)))
+        selected_slots.sort()  # Sort chronologically
+        
+        post_times = []
+        for day_offset, hour in selected_slots:
+            day = week_start + timedelta(days=day_offset)
+            post_times.append(day.replace(hour=hour, minute=self.rng.randint(0, 59)))
+        return post_times
+    
+    def make_post(self, index: int, post_time: datetime, data: dict) -> Post:
+        """Build the scheduled Post for slot `index` (0-based) from generated content."""
+        return Post(
+            id=f"P{index+1}",  # P1, P2, P3 format
+            date=post_time,
+            persona=data["persona"],
+            username=data["username"],
+            subreddit=data["subreddit"],
+            title=data["title"],
+            content=data["content"],
+            content_type=ContentType.POST,
+            thread_id=f"thread_{index+1}",
+            keyword_ids=data.get("keyword_ids", [])
+        )
+    
     def distribute_posts(
         self,
         week_start: datetime,
@@ -36,42 +119,8 @@ class Scheduler:
         Returns:
             List of scheduled Post objects
         """
-        posts = []
-        week_days = 7
-        hours_per_day = [9, 11, 14, 16, 18]  # Business hours for posting
-        
-        # Distribute posts across weekdays (avoid weekends for better engagement)
-        weekday_slots = []
-        for day_offset in range(week_days):
-            day = week_start + timedelta(days=day_offset)
-            if day.weekday() < 5:  # Monday-Friday
-                for hour in hours_per_day:
-                    weekday_slots.append((day, hour))
-        
-        # Shuffle and select slots
-        random.shuffle(weekday_slots)
-        selected_slots = weekday_slots[:len(post_data)]
-        selected_slots.sort()  # Sort chronologically
-        
-        for i, slot in enumerate(selected_slots):
-            day, hour = slot
-            post_time = day.replace(hour=hour, minute=random.randint(0, 59))
-            
-            post = Post(
-                id=f"P{i+1}",  # P1, P2, P3 format
-                date=post_time,
-                persona=post_data[i]["persona"],
-                username=post_data[i]["username"],
-                subreddit=post_data[i]["subreddit"],
-                title=post_data[i]["title"],
-                content=post_data[i]["content"],
-                content_type=ContentType.POST,
-                thread_id=f"thread_{i+1}",
-                keyword_ids=post_data[i].get("keyword_ids", [])
-            )
-            posts.append(post)
-        
-        return posts
+        post_times = self.plan_slots(week_start, len(post_data))
+        return [self.make_post(i, post_time, post_data[i]) for i, post_time in enumerate(post_times)]
     
     def schedule_replies(
         self,
@@ -89,7 +138,10 @@ class Scheduler:
         Returns:
             List of Reply Post objects
         """
+        rng = self.rng
+        
         replies = []
+        replies_by_post: Dict[str, List[Post]] = defaultdict(list)
         comment_counter = 1  # C1, C2, C3, etc.
         
         for post in posts:
@@ -100,37 +152,37 @@ class Scheduler:
             
             # Generate 1-3 replies per post (70% chance of 1, 20% chance of 2, 10% chance of 3)
             num_replies = 1
-            rand = random.random()
+            rand = rng.random()
             if rand < 0.1:
                 num_replies = 3
             elif rand < 0.3:
                 num_replies = 2
             
-            # Get all existing replies for this post to support nested replies
-            existing_replies = [r for r in replies if r.parent_post_id == post.id]
+            # Existing replies for this post, to support nested replies
+            existing_replies = replies_by_post[post.id]
             
             for reply_num in range(num_replies):
                 # Schedule reply 15 minutes to 24 hours after original post (or previous reply)
                 if reply_num == 0:
                     base_time = post.date
-                    hours_delay = random.randint(1, 24)  # First reply: 1-24 hours
+                    hours_delay = rng.randint(1, 24)  # First reply: 1-24 hours
                 else:
                     base_time = replies[-1].date if replies else post.date
-                    hours_delay = random.randint(1, 6)  # Subsequent replies: 1-6 hours
+                    hours_delay = rng.randint(1, 6)  # Subsequent replies: 1-6 hours
                 
-                reply_time = base_time + timedelta(hours=hours_delay, minutes=random.randint(0, 59))
+                reply_time = base_time + timedelta(hours=hours_delay, minutes=rng.randint(0, 59))
                 
                 # Ensure reply is within the same week
                 week_end = post.date + timedelta(days=7)
                 if reply_time > week_end:
-                    reply_time = post.date + timedelta(hours=random.randint(1, 12))
+                    reply_time = post.date + timedelta(hours=rng.randint(1, 12))
                 
                 # Determine if this is a nested reply (reply to a comment)
                 parent_comment_id = None
                 if reply_num > 0 and existing_replies:
                     # 30% chance of replying to a previous comment
-                    if random.random() < 0.3:
-                        parent_comment_id = random.choice(existing_replies).id
+                    if rng.random() < 0.3:
+                        parent_comment_id = rng.choice(existing_replies).id
                 
                 # Select persona for this reply (different from post author)
                 if reply_num == 0:
@@ -138,11 +190,13 @@ class Scheduler:
                     reply_username = reply_info["username"]
                 else:
                     # For subsequent replies, use different personas
-                    available_personas = [p for p in self.personas if p.username != post.username]
+                    excluded = {post.username}
                     if existing_replies:
-                        available_personas = [p for p in available_personas if p.username != existing_replies[-1].username]
-                    if available_personas:
-                        selected_persona = random.choice(available_personas)
+                        excluded.add(existing_replies[-1].username)
+                    # Sorted so a seeded random picks the same persona every run
+                    available_usernames = sorted(self._persona_set - excluded)
+                    if available_usernames:
+                        selected_persona = self.personas_by_username[rng.choice(available_usernames)]
                         reply_persona = selected_persona.name
                         reply_username = selected_persona.username
                     else:
@@ -156,7 +210,7 @@ class Scheduler:
                     username=reply_username,
                     subreddit=post.subreddit,
                     title="",  # Comments don't have titles
-                    content=reply_info["content"] if reply_num == 0 else self._generate_nested_reply(post, existing_replies),
+                    content=reply_info["content"] if reply_num == 0 else self._generate_nested_reply(post, existing_replies, rng),
                     content_type=ContentType.REPLY,
                     parent_post_id=post.id,
                     parent_comment_id=parent_comment_id,
@@ -165,23 +219,14 @@ class Scheduler:
                 replies.append(reply)
                 comment_counter += 1
                 
-                # Update existing_replies for next iteration
+                # Update existing_replies (replies_by_post) for next iteration
                 existing_replies.append(reply)
         
         return replies
     
-    def _generate_nested_reply(self, post: Post, existing_replies: List[Post]) -> str:
+    def _generate_nested_reply(self, post: Post, existing_replies: List[Post], rng=random) -> str:
         """Generate a simple nested reply."""
-        # Simple fallback responses that sound natural
-        responses = [
-            "Thanks for sharing! I've had similar experiences.",
-            "Great point! I've found this helpful too.",
-            "This is exactly what I needed to hear.",
-            "Same here! This has been a game changer for me.",
-            "Appreciate the insight! Going to try this out.",
-            "This resonates with me. Thanks for the tip!"
-        ]
-        return random.choice(responses)
+        return rng.choice(_NESTED_REPLIES)
     
     def assign_subreddits(self, num_posts: int) -> List[str]:
         """
@@ -193,23 +238,23 @@ class Scheduler:
         assignments = []
         subreddit_counts = {sub: 0 for sub in self.subreddits}
         
+        # Least-used subreddit first, ties broken randomly
+        heap = [[0, self.rng.random(), sub] for sub in subreddit_counts]
+        heapq.heapify(heap)
+        
         for _ in range(num_posts):
-            # Find subreddits that haven't exceeded limit
-            available = [
-                sub for sub, count in subreddit_counts.items()
-                if count < self.max_posts_per_subreddit
-            ]
-            
-            if not available:
+            if not heap:
                 # If all are at limit, reset and use all
-                available = self.subreddits
-            
-            # Weight towards less-used subreddits
-            weights = [1.0 / (subreddit_counts[sub] + 1) for sub in available]
-            selected = random.choices(available, weights=weights)[0]
+                heap = [[count, self.rng.random(), sub] for sub, count in subreddit_counts.items()]
+                heapq.heapify(heap)
             
+            count, _, selected = heapq.heappop(heap)
             assignments.append(selected)
-            subreddit_counts[selected] += 1
+            subreddit_counts[selected] = count + 1
+            
+            # Subreddits that reached the limit drop out until the reset
+            if count + 1 < self.max_posts_per_subreddit:
+                heapq.heappush(heap, [count + 1, self.rng.random(), selected])
         
         return assignments
     
@@ -220,18 +265,42 @@ class Scheduler:
         Returns:
             List of persona usernames
         """
-        assignments = []
-        persona_usernames = [p.username for p in self.personas]
+        return [p.username for p in self.assign_persona_objects(num_posts)]
+    
+    def assign_persona_objects(self, num_posts: int) -> List[Persona]:
+        """
+        Assign personas to posts, rotating for variety.
         
-        for i in range(num_posts):
-            # Rotate personas
-            persona = persona_usernames[i % len(persona_usernames)]
-            assignments.append(persona)
+        Returns:
+            List of Persona objects, one per post
+        """
+        # Rotate personas
+        assignments = [self.personas[i % len(self.personas)] for i in range(num_posts)]
         
         # Shuffle to avoid predictable patterns
-        random.shuffle(assignments)
+        self.rng.shuffle(assignments)
         return assignments
     
+    def make_entry(self, content: Post) -> CalendarEntry:
+        """Convert a scheduled post or reply into a calendar entry."""
+        is_post = content.content_type is ContentType.POST
+        return CalendarEntry(
+            post_id=content.id if is_post else None,
+            comment_id=None if is_post else content.id,
+            date=content.date,
+            time=_fmt_time(content.date.hour, content.date.minute),
+            type=content.content_type,
+            persona=content.persona,
+            username=content.username,
+            subreddit=content.subreddit,
+            title=content.title,
+            content=content.content,
+            parent_post_id=content.parent_post_id,
+            parent_comment_id=content.parent_comment_id,
+            thread_id=content.thread_id,
+            keyword_ids=content.keyword_ids
+        )
+    
     def create_calendar(
         self,
         week_start: datetime,
@@ -249,28 +318,13 @@ class Scheduler:
         Returns:
             ContentCalendar object
         """
-        all_content = posts + replies
-        all_content.sort(key=lambda x: x.date)
-        
-        entries = []
-        for content in all_content:
-            entry = CalendarEntry(
-                post_id=content.id if content.content_type == ContentType.POST else None,
-                comment_id=content.id if content.content_type == ContentType.REPLY else None,
-                date=content.date,
-                time=content.date.strftime("%I:%M %p"),
-                type=content.content_type,
-                persona=content.persona,
-                username=content.username,
-                subreddit=content.subreddit,
-                title=content.title,
-                content=content.content,
-                parent_post_id=content.parent_post_id,
-                parent_comment_id=content.parent_comment_id,
-                thread_id=content.thread_id,
-                keyword_ids=content.keyword_ids if hasattr(content, 'keyword_ids') else []
-            )
-            entries.append(entry)
+        # Posts are already chronological (see plan_slots), so merging them
+        # with the sorted replies avoids re-sorting everything
+        by_date = attrgetter("date")
+        entries = [
+            self.make_entry(content)
+            for content in heapq.merge(posts, sorted(replies, key=by_date), key=by_date)
+        ]
         
         week_end = week_start + timedelta(days=7)
         
@@ -281,7 +335,7 @@ class Scheduler:
             metadata={
                 "total_posts": len(posts),
                 "total_replies": len(replies),
-                "subreddits_used": list(set(e.subreddit for e in entries))
+                "subreddits_used": list(dict.fromkeys(e.subreddit for e in entries))
             }
         )
 
@@ -1,10 +1,28 @@
 """
 Quality validation system for content calendars.
 """
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import groupby
+from operator import attrgetter
 from typing import List, Dict, Tuple
+import numpy as np
 from models import ContentCalendar, CalendarEntry, ContentType
 
 
+@dataclass
+class _CalendarIndex:
+    """Views of a calendar's entries shared by all quality checks."""
+    posts: List[CalendarEntry] = field(default_factory=list)
+    replies: List[CalendarEntry] = field(default_factory=list)
+    posts_sorted: List[CalendarEntry] = field(default_factory=list)
+    subreddit_counts: Counter = field(default_factory=Counter)
+    daily_topics: Dict[date, List[str]] = field(default_factory=lambda: defaultdict(list))
+    persona_sequence: List[str] = field(default_factory=list)
+    thread_entries: List[CalendarEntry] = field(default_factory=list)  # Sorted by thread, then time
+
+
 class QualityValidator:
     """Validates content calendar quality and catches edge cases."""
     
@@ -24,36 +42,55 @@ class QualityValidator:
         self.errors = []
         
         score = 10.0
+        index = self._build_index(calendar)
         
         # Check 1: Subreddit distribution
-        score -= self._check_subreddit_distribution(calendar)
+        score -= self._check_subreddit_distribution(index)
         
         # Check 2: Topic overlap
-        score -= self._check_topic_overlap(calendar)
+        score -= self._check_topic_overlap(index)
         
         # Check 3: Persona consistency
-        score -= self._check_persona_patterns(calendar)
+        score -= self._check_persona_patterns(index)
         
         # Check 4: Timing issues
-        score -= self._check_timing_issues(calendar)
+        score -= self._check_timing_issues(index)
         
         # Check 5: Conversation flow
-        score -= self._check_conversation_flow(calendar)
+        score -= self._check_conversation_flow(index)
         
         # Check 6: Reply distribution
-        score -= self._check_reply_distribution(calendar)
+        score -= self._check_reply_distribution(index)
         
         # Ensure score is between 0 and 10
         score = max(0.0, min(10.0, score))
         
         return score, self.warnings
     
-    def _check_subreddit_distribution(self, calendar: ContentCalendar) -> float:
-        """Check if posts are evenly distributed across subreddits."""
-        subreddit_counts = {}
+    @staticmethod
+    def _build_index(calendar: ContentCalendar) -> _CalendarIndex:
+        """Collect everything the checks need in a single pass over the entries."""
+        index = _CalendarIndex()
         for entry in calendar.entries:
-            if entry.type == ContentType.POST:
-                subreddit_counts[entry.subreddit] = subreddit_counts.get(entry.subreddit, 0) + 1
+            if entry.type is ContentType.POST:
+                index.posts.append(entry)
+                index.subreddit_counts[entry.subreddit] += 1
+                index.daily_topics[entry.date.date()].append(entry.title.lower())
+                index.persona_sequence.append(entry.persona)
+            elif entry.type is ContentType.REPLY:
+                index.replies.append(entry)
+            if entry.thread_id:
+                index.thread_entries.append(entry)
+        
+        # Entries are normally already chronological, making this a linear pass
+        index.posts_sorted = sorted(index.posts, key=lambda x: x.date)
+        # Posts sort ahead of replies made at the same moment
+        index.thread_entries.sort(key=lambda x: (x.thread_id, x.date, x.type is ContentType.REPLY))
+        return index
+    
+    def _check_subreddit_distribution(self, index: _CalendarIndex) -> float:
+        """Check if posts are evenly distributed across subreddits."""
+        subreddit_counts = dict(index.subreddit_counts)
         
         if not subreddit_counts:
             return 0.0
@@ -79,39 +116,37 @@ class QualityValidator:
         
         return 0.0
     
-    def _check_topic_overlap(self, calendar: ContentCalendar) -> float:
+    def _check_topic_overlap(self, index: _CalendarIndex) -> float:
         """Check for overlapping topics on the same day."""
-        daily_topics = {}
-        for entry in calendar.entries:
-            if entry.type == ContentType.POST:
-                day = entry.date.date()
-                if day not in daily_topics:
-                    daily_topics[day] = []
-                daily_topics[day].append(entry.title.lower())
-        
         penalty = 0.0
-        for day, topics in daily_topics.items():
-            # Check for similar titles (simple word overlap check)
-            for i, topic1 in enumerate(topics):
-                for topic2 in topics[i+1:]:
-                    words1 = set(topic1.split())
-                    words2 = set(topic2.split())
-                    overlap = len(words1 & words2) / max(len(words1), len(words2))
-                    
-                    if overlap > 0.4:  # 40% word overlap
-                        self.warnings.append(
-                            f"Similar topics on {day}: '{topic1}' and '{topic2}'"
-                        )
-                        penalty += 0.5
+        for day, topics in index.daily_topics.items():
+            if len(topics) < 2:
+                continue
+            
+            # Check for similar titles (simple word overlap check), for all
+            # pairs at once: with a 0/1 title x word matrix X, (X @ X.T)[i, j]
+            # is the number of words titles i and j share
+            word_sets = [set(topic.split()) for topic in topics]
+            vocab = {word: j for j, word in enumerate(set().union(*word_sets))}
+            X = np.zeros((len(topics), len(vocab)))
+            for i, words in enumerate(word_sets):
+                X[i, [vocab[word] for word in words]] = 1.0
+            
+            shared = X @ X.T
+            sizes = X.sum(axis=1)
+            overlap = shared / np.maximum(np.maximum.outer(sizes, sizes), 1.0)
+            
+            for i, j in np.argwhere(np.triu(overlap > 0.4, k=1)):  # 40% word overlap
+                self.warnings.append(
+                    f"Similar topics on {day}: '{topics[i]}' and '{topics[j]}'"
+                )
+                penalty += 0.5
         
         return min(penalty, 1.5)
     
-    def _check_persona_patterns(self, calendar: ContentCalendar) -> float:
+    def _check_persona_patterns(self, index: _CalendarIndex) -> float:
         """Check for awkward persona patterns."""
-        persona_sequence = []
-        for entry in calendar.entries:
-            if entry.type == ContentType.POST:
-                persona_sequence.append(entry.persona)
+        persona_sequence = index.persona_sequence
         
         # Check if same persona posts consecutively too often
         consecutive_count = 1
@@ -132,10 +167,9 @@ class QualityValidator:
         
         return 0.0
     
-    def _check_timing_issues(self, calendar: ContentCalendar) -> float:
+    def _check_timing_issues(self, index: _CalendarIndex) -> float:
         """Check for timing problems (posts too close together, etc.)."""
-        posts = [e for e in calendar.entries if e.type == ContentType.POST]
-        posts.sort(key=lambda x: x.date)
+        posts = index.posts_sorted
         
         penalty = 0.0
         for i in range(len(posts) - 1):
@@ -153,32 +187,32 @@ class QualityValidator:
         
         return min(penalty, 1.0)
     
-    def _check_conversation_flow(self, calendar: ContentCalendar) -> float:
+    def _check_conversation_flow(self, index: _CalendarIndex) -> float:
         """Check if replies make sense in context."""
-        threads = {}
-        for entry in calendar.entries:
-            if entry.thread_id:
-                if entry.thread_id not in threads:
-                    threads[entry.thread_id] = []
-                threads[entry.thread_id].append(entry)
-        
         penalty = 0.0
-        for thread_id, thread_entries in threads.items():
-            # Check if reply comes before post (shouldn't happen)
-            posts = [e for e in thread_entries if e.type == ContentType.POST]
-            replies = [e for e in thread_entries if e.type == ContentType.REPLY]
+        for thread_id, thread_entries in groupby(index.thread_entries, key=attrgetter("thread_id")):
+            # Entries are in time order, so the first post seen is the
+            # original and any reply seen before it comes too early
+            has_post = False
+            early_replies = 0
+            reply_personas = []
+            for entry in thread_entries:
+                if entry.type is ContentType.POST:
+                    has_post = True
+                elif entry.type is ContentType.REPLY:
+                    reply_personas.append(entry.persona)
+                    if not has_post:
+                        early_replies += 1
             
-            if posts and replies:
-                first_post = min(posts, key=lambda x: x.date)
-                for reply in replies:
-                    if reply.date < first_post.date:
-                        self.warnings.append(
-                            f"Reply scheduled before original post in thread {thread_id}"
-                        )
-                        penalty += 1.0
+            if has_post and reply_personas:
+                # Check if reply comes before post (shouldn't happen)
+                for _ in range(early_replies):
+                    self.warnings.append(
+                        f"Reply scheduled before original post in thread {thread_id}"
+                    )
+                    penalty += 1.0
                 
                 # Check if multiple replies from same persona in same thread
-                reply_personas = [r.persona for r in replies]
                 if len(reply_personas) != len(set(reply_personas)):
                     self.warnings.append(
                         f"Same persona replies multiple times in thread {thread_id}"
@@ -187,10 +221,10 @@ class QualityValidator:
         
         return min(penalty, 2.0)
     
-    def _check_reply_distribution(self, calendar: ContentCalendar) -> float:
+    def _check_reply_distribution(self, index: _CalendarIndex) -> float:
         """Check if replies are well-distributed."""
-        posts = [e for e in calendar.entries if e.type == ContentType.POST]
-        replies = [e for e in calendar.entries if e.type == ContentType.REPLY]
+        posts = index.posts
+        replies = index.replies
         
         if not posts:
             return 0.0